@@ -1,150 +1,111 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import re
 import json
-import urllib.parse
-from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QLineEdit, QPushButton, QTextEdit, QVBoxLayout, QHBoxLayout, QWidget
-from PyQt5.QtCore import QThread, pyqtSignal
-
-def extract_category(text, category, regex_terms):
-    for term in regex_terms:
-        match = re.search(term, text, re.IGNORECASE)
-        if match:
-            start_index = match.start()
-            end_index = text.find('\n', start_index)
-            if end_index == -1:
-                end_index = len(text)
-            return text[start_index:end_index].strip()
-    return None
-
-def classify_job_description(job_description):
-    categories = {
-        'job_title': [r'\b(job title|position|role)\b', r'\b(we are looking for|we are seeking|seeking|looking for)\b'],
-        'company': [r'\b(company|organization|employer)\b', r'\b(about us|who we are)\b'],
-        'location': [r'\b(location|city|state|place)\b', r'\b(where)\b'],
-        'salary': [r'\b(salary|pay|compensation|wage)\b', r'\b(\$\d+(\.\d+)?(\s+|-)\$\d+(\.\d+)?)\b'],
-        'job_type': [r'\b(job type|employment type)\b', r'\b(full[-\s]time|part[-\s]time|contract|temporary|permanent)\b'],
-        'benefits': [r'\b(benefits|perks)\b', r'\b(health insurance|dental insurance|401k|vacation|paid time off)\b'],
-        'required_skills': [r'\b(required skills|must have|requirements|qualifications)\b', r'\b(proficiency|experience|familiarity) with\b'],
-        'preferred_skills': [r'\b(preferred skills|nice to have|bonus|additional qualifications)\b', r'\b(knowledge of|experience with|familiarity with)\b'],
-        'education': [r'\b(education|degree|diploma)\b', r'\b(bachelor''s|master''s|phd|high school|college)\b'],
-        'experience': [r'\b(experience|years of experience)\b', r'\b(\d+(\+)?\s+years)\b']
-    }
-
-    classified_data = {}
-    raw_text = []
-
-    for category, regex_terms in categories.items():
-        extracted_text = extract_category(job_description, category, regex_terms)
-        if extracted_text:
-            classified_data[category] = extracted_text
-        else:
-            raw_text.append(job_description)
-
-    if raw_text:
-        classified_data['raw'] = ' '.join(raw_text)
-
-    return classified_data
-
-def get_job_text(driver):
-    try:
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        job_text = driver.find_element(By.TAG_NAME, "body").text.strip()
-        return job_text if job_text else None
-    except:
-        return None
-        
+import collections
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QVBoxLayout, QHBoxLayout, QWidget,
+                             QTableView, QHeaderView, QAbstractItemView)
+from PyQt5.QtCore import QThread, QTimer, QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from job_store import JobPostWriter
+from scrape_engine import ScrapeEngine
+from job_classifier import classify_job_description
+
+# Postings kept in the preview table; every posting is in job_posts.jsonl
+MAX_PREVIEW_ROWS = 1000
+# Milliseconds between preview updates; postings scraped in between are added together
+PREVIEW_INTERVAL_MS = 250
+
 class ScraperThread(QThread):
-    data_scraped = pyqtSignal(dict)
+    # One posting at a time: (job URL, classified details)
+    posting_scraped = pyqtSignal(str, dict)
     finished = pyqtSignal()
 
-    def __init__(self, search_terms, location, num_results):
+    def __init__(self, search_terms, location, num_results, num_browsers=4, fetch_mode='browser'):
         super().__init__()
         self.search_terms = search_terms
         self.location = location
         self.num_results = num_results
-        self.stop_flag = False
-        self.next_search_term_flag = False
-        
-
-            
-    def run(self):
-        job_posts = {}
-
-        driver = webdriver.Firefox()
-
-        for search_term in self.search_terms:
-            if self.stop_flag:
-                break
-
-            encoded_search_term = urllib.parse.quote(search_term)
-            encoded_location = urllib.parse.quote(self.location)
-            search_url = f"https://www.indeed.com/jobs?q={encoded_search_term}&l={encoded_location}"
+        self.num_browsers = num_browsers
+        self.fetch_mode = fetch_mode
+        self.engine = None
 
-            driver.get(search_url)
+    def stop(self):
+        if self.engine:
+            self.engine.stop()
 
-            while True:
-                if self.stop_flag or self.next_search_term_flag:
-                    break
-
-                link_elements = driver.find_elements(By.XPATH, "//a")
-                hrefs = []
-
-                for link in link_elements:
-                    try:
-                        href = link.get_attribute("href")
-                        if href and href.startswith("https://www.indeed.com/rc/clk") and href not in job_posts:
-                            hrefs.append(href)
-                    except StaleElementReferenceException:
-                        continue
-
-                for href in hrefs:
-                    if self.stop_flag or self.next_search_term_flag:
-                        break
-    
-                    driver.execute_script(f"window.open('{href}', '_blank');")
-                    driver.switch_to.window(driver.window_handles[-1])
-    
-                    job_text = None
-                    while job_text is None:
-                        job_text = get_job_text(driver)
-    
-                    classified_data = classify_job_description(job_text)
-                    job_posts[href] = classified_data
-    
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
-                    self.data_scraped.emit(job_posts)
+    def next_search_term(self):
+        if self.engine:
+            self.engine.skip_search_term()
 
+    def run(self):
+        # Each posting is appended to job_posts.jsonl as soon as it is scraped, after those of earlier crawls
+        writer = JobPostWriter()
 
+        def on_posting(href, classified_data):
+            writer.write(href, classified_data)
+            self.posting_scraped.emit(href, classified_data)
 
-                if len(job_posts) >= self.num_results:
-                    break
+        self.engine = ScrapeEngine(self.search_terms, self.location, self.num_results,
+                                   classify_job_description, on_posting, num_drivers=self.num_browsers,
+                                   fetch_mode=self.fetch_mode)
+        self.engine.run()
+        writer.close()
 
-                try:
-                    next_page_button = driver.find_element(By.XPATH, "//a[@data-testid='pagination-page-next']")
-                    if next_page_button:
-                        next_page_url = next_page_button.get_attribute("href")
-                        driver.get(next_page_url)
-                    else:
-                        break
-                except NoSuchElementException:
-                    break
+        self.finished.emit()
 
-                with open("job_posts.json", "w") as file:
-                    json.dump(job_posts, file, indent=4)
+class JobPostsModel(QAbstractTableModel):
+    """ The most recent postings as table rows, added in batches
 
-            self.next_search_term_flag = False
+    Only max_rows postings are kept and the oldest drop off the top, so memory
+    stays the same however long the crawl runs, and the view only asks for
+    the cells it is showing.
+    """
+    COLUMNS = ['Job Title', 'Company Name', 'Location', 'Salary', 'Job Type']
 
-        driver.quit()
+    def __init__(self, max_rows=MAX_PREVIEW_ROWS):
+        super().__init__()
+        self.max_rows = max_rows
+        self.rows = collections.deque()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        job_url, job_details = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return str(job_details.get(self.COLUMNS[index.column()], ''))
+        if role == Qt.ToolTipRole:
+            return job_url
+        return None
 
-        with open("job_posts.json", "w") as file:
-            json.dump(job_posts, file, indent=4)
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
 
-        self.finished.emit()
+    def add_postings(self, postings):
+        """ Append a batch of (job_url, job_details) pairs, dropping the oldest rows past max_rows """
+        postings = postings[-self.max_rows:]
+        overflow = len(self.rows) + len(postings) - self.max_rows
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.rows.popleft()
+            self.endRemoveRows()
+        if postings:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(postings) - 1)
+            self.rows.extend(postings)
+            self.endInsertRows()
+
+    def posting(self, row):
+        return self.rows[row]
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows.clear()
+        self.endResetModel()
 
 class JobScraper(QMainWindow):
     def __init__(self):
@@ -161,6 +122,9 @@ class JobScraper(QMainWindow):
         self.location_field = QLineEdit("Atlanta, GA")
         self.num_results_label = QLabel("Number of Results:")
         self.num_results_field = QLineEdit()
+        self.num_browsers_label = QLabel("Parallel Browsers:")
+        self.num_browsers_field = QLineEdit("4")
+        self.http_fetch_checkbox = QCheckBox("Fetch job pages over HTTP (browser only as fallback)")
         self.search_button = QPushButton("Search")
         self.search_button.clicked.connect(self.start_scraper)
 
@@ -171,9 +135,27 @@ class JobScraper(QMainWindow):
 
         self.status_label = QLabel()
 
+        # The latest postings, and the JSON of the one selected
+        self.preview_model = JobPostsModel()
+        self.preview_table = QTableView()
+        self.preview_table.setModel(self.preview_model)
+        self.preview_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.preview_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        # Fixed row heights, so adding rows never measures the ones already there
+        self.preview_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.preview_table.horizontalHeader().setStretchLastSection(True)
+        self.preview_table.selectionModel().currentRowChanged.connect(self.show_posting)
+
         self.json_preview_area = QTextEdit()
         self.json_preview_area.setReadOnly(True)
 
+        # Postings wait here until the next timer tick adds them to the table in one go
+        self.pending_postings = []
+        self.postings_scraped = 0
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setInterval(PREVIEW_INTERVAL_MS)
+        self.preview_timer.timeout.connect(self.flush_preview)
+
         grid_layout = QVBoxLayout()
         grid_layout.addWidget(QLabel("Search Terms (comma-separated):"))
         grid_layout.addWidget(self.search_terms_field)
@@ -182,13 +164,20 @@ class JobScraper(QMainWindow):
         grid_layout.addWidget(self.location_field)
         grid_layout.addWidget(self.num_results_label)
         grid_layout.addWidget(self.num_results_field)
+        grid_layout.addWidget(self.num_browsers_label)
+        grid_layout.addWidget(self.num_browsers_field)
+        grid_layout.addWidget(self.http_fetch_checkbox)
         grid_layout.addWidget(self.search_button)
         grid_layout.addWidget(self.stop_button)
         grid_layout.addWidget(self.next_search_term_button)
 
+        preview_layout = QVBoxLayout()
+        preview_layout.addWidget(self.preview_table, 2)
+        preview_layout.addWidget(self.json_preview_area, 1)
+
         main_layout = QHBoxLayout()
         main_layout.addLayout(grid_layout)
-        main_layout.addWidget(self.json_preview_area)
+        main_layout.addLayout(preview_layout)
 
         status_layout = QHBoxLayout()
         status_layout.addWidget(QLabel("Status:"))
@@ -211,31 +200,59 @@ class JobScraper(QMainWindow):
     def start_scraper(self):
         location = self.location_field.text()
         num_results = int(self.num_results_field.text())
+        num_browsers = int(self.num_browsers_field.text())
+        fetch_mode = 'http' if self.http_fetch_checkbox.isChecked() else 'browser'
+
+        self.preview_model.clear()
+        self.json_preview_area.clear()
+        self.pending_postings = []
+        self.postings_scraped = 0
 
-        self.scraper_thread = ScraperThread(self.search_terms, location, num_results)
-        self.scraper_thread.data_scraped.connect(self.update_json_preview)
+        self.scraper_thread = ScraperThread(self.search_terms, location, num_results, num_browsers, fetch_mode)
+        self.scraper_thread.posting_scraped.connect(self.queue_posting)
         self.scraper_thread.finished.connect(self.scraper_finished)
         self.scraper_thread.start()
+        self.preview_timer.start()
 
         self.status_label.setText("Scraper started")
 
     def stop_scraper(self):
         if self.scraper_thread and self.scraper_thread.isRunning():
-            self.scraper_thread.stop_flag = True
+            self.scraper_thread.stop()
             self.status_label.setText("Scraper stopped")
 
 
     
     def next_search_term(self):
         if self.scraper_thread and self.scraper_thread.isRunning():
-            self.scraper_thread.next_search_term_flag = True
+            self.scraper_thread.next_search_term()
             self.status_label.setText("Moving to next search term")
 
-    def update_json_preview(self, job_posts):
-        self.json_preview_area.setText(json.dumps(job_posts, indent=4))
+    def queue_posting(self, job_url, job_details):
+        self.pending_postings.append((job_url, job_details))
+        self.postings_scraped += 1
+
+    def flush_preview(self):
+        """ Add the postings scraped since the last tick to the table, following the newest if it was at the bottom """
+        if not self.pending_postings:
+            return
+        scrollbar = self.preview_table.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        self.preview_model.add_postings(self.pending_postings)
+        self.pending_postings = []
+        if at_bottom:
+            self.preview_table.scrollToBottom()
+        self.status_label.setText(f"Scraper running: {self.postings_scraped} postings scraped")
+
+    def show_posting(self, current, previous):
+        if current.isValid():
+            job_url, job_details = self.preview_model.posting(current.row())
+            self.json_preview_area.setPlainText(json.dumps({job_url: job_details}, indent=4))
 
     def scraper_finished(self):
-        self.status_label.setText("Scraper finished")
+        self.preview_timer.stop()
+        self.flush_preview()
+        self.status_label.setText("Scraper finished. " + self.scraper_thread.engine.stats.summary())
 
 if __name__ == "__main__":
     app = QApplication([])
@@ -0,0 +1,137 @@
+import re
+import json
+import time
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+
+# Model built by "ollama uncensored models/create_ollama_models.sh"
+DEFAULT_OLLAMA_MODEL = 'uncensored_phi3'
+DEFAULT_OLLAMA_HOST = 'http://localhost:11434'
+# Context window the models are loaded with; prompts are compacted to fit it
+DEFAULT_N_CTX = 2048
+
+# Backends that wait on something else (a server, a timer) and can share a process between threads
+THREADED_BACKENDS = {'ollama', 'fake'}
+
+
+class OllamaBackend:
+    """ Generates through an Ollama server's /api/generate endpoint
+
+    The same generate() interface as GPT4All, so the rest of the pipeline does
+    not care which one it talks to. Connections are kept alive in a pool sized
+    for the number of threads sending requests at once.
+    """
+
+    def __init__(self, model=DEFAULT_OLLAMA_MODEL, host=DEFAULT_OLLAMA_HOST, pool_size=4, timeout=600, n_ctx=None):
+        self.model = model
+        self.n_ctx = n_ctx
+        self.url = host.rstrip('/') + '/api/generate'
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def generate(self, prompt, max_tokens=200, streaming=False, callback=None, temp=None, top_k=None, top_p=None,
+                 repeat_penalty=None, **ignored):
+        options = {'num_predict': max_tokens, 'num_ctx': self.n_ctx, 'temperature': temp, 'top_k': top_k, 'top_p': top_p,
+                   'repeat_penalty': repeat_penalty}
+        request = {'model': self.model, 'prompt': prompt, 'stream': True,
+                   'options': {name: value for name, value in options.items() if value is not None}}
+        pieces = self._stream(request, callback)
+        return pieces if streaming else ''.join(pieces)
+
+    def _stream(self, request, callback):
+        with self.session.post(self.url, json=request, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for index, line in enumerate(response.iter_lines()):
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('response'):
+                    yield chunk['response']
+                    # Closing the response early tells the server to stop generating
+                    if callback is not None and callback(index, chunk['response']) is False:
+                        return
+                if chunk.get('done'):
+                    return
+
+    def close(self):
+        self.session.close()
+
+
+class FakeBackend:
+    """ Deterministic stand-in for a model, for testing and benchmarking the pipeline without weights
+
+    Sleeps latency seconds per prompt plus token_latency per generated token,
+    then answers with the same text every time it sees the same prompt: a
+    JSON object when the prompt lists JSON keys, "- Field: answer" lines
+    otherwise, followed by filler up to max_tokens.
+    """
+
+    def __init__(self, latency=0.0, token_latency=0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+
+    def answer(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        keys = re.findall(r'using exactly these keys: (\{.*\})', prompt)
+        if keys:
+            fields = json.loads(keys[-1])
+            text = json.dumps({field: f"fake answer {digest[:8]}" for field in fields})
+        else:
+            fields = dict.fromkeys(re.findall(r'^\s*- ([A-Z][\w ]+): \[', prompt, re.MULTILINE)) or ['Answer']
+            text = '\n' + '\n'.join(f"- {field}: fake answer {digest[:8]}" for field in fields)
+        return text + ' The rest of this reply is filler.' * 50
+
+    def generate(self, prompt, max_tokens=200, streaming=False, callback=None, **ignored):
+        pieces = self._stream(prompt, max_tokens, callback)
+        return pieces if streaming else ''.join(pieces)
+
+    def _stream(self, prompt, max_tokens, callback):
+        time.sleep(self.latency)
+        for index, piece in enumerate(re.findall(r'\S+\s*|\s+', self.answer(prompt))[:max_tokens]):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield piece
+            if callback is not None and callback(index, piece) is False:
+                return
+
+
+def load_backend(backend, model_name, n_threads=None, **options):
+    """ Create the model for one worker; options are the backend_options from the command line """
+    if backend == 'gpt4all':
+        from gpt4all import GPT4All
+        return GPT4All(model_name, n_threads=n_threads, n_ctx=options.get('n_ctx') or DEFAULT_N_CTX)
+    if backend == 'ollama':
+        return OllamaBackend(options.get('ollama_model') or DEFAULT_OLLAMA_MODEL, options.get('ollama_host') or DEFAULT_OLLAMA_HOST,
+                             pool_size=options.get('pool_size', 4), n_ctx=options.get('n_ctx'))
+    if backend == 'fake':
+        return FakeBackend(options.get('fake_latency', 0.0), options.get('fake_token_latency', 0.0))
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def backend_model_name(backend, model_name, **options):
+    """ Name the cache stores responses under, so answers from different backends never mix """
+    if backend == 'ollama':
+        return f"ollama:{options.get('ollama_model') or DEFAULT_OLLAMA_MODEL}"
+    if backend == 'fake':
+        return 'fake'
+    return model_name
+
+
+def add_backend_arguments(parser):
+    parser.add_argument('--backend', choices=['gpt4all', 'ollama', 'fake'], default='gpt4all',
+                        help="gpt4all runs the model in-process, ollama sends prompts to an Ollama server, fake answers instantly without a model")
+    parser.add_argument('--n-ctx', type=int, default=DEFAULT_N_CTX,
+                        help="context window in tokens to load the model with; prompts are compacted to fit it along with the answer")
+    parser.add_argument('--ollama-model', default=DEFAULT_OLLAMA_MODEL, help="Ollama model to use with --backend ollama")
+    parser.add_argument('--ollama-host', default=DEFAULT_OLLAMA_HOST)
+    parser.add_argument('--fake-latency', type=float, default=0.0, help="seconds the fake backend waits before answering each prompt")
+    parser.add_argument('--fake-token-latency', type=float, default=0.0, help="seconds the fake backend waits per generated token")
+
+
+def backend_options_from_args(args):
+    return dict(n_ctx=args.n_ctx, ollama_model=args.ollama_model, ollama_host=args.ollama_host, pool_size=max(args.workers, 1),
+                fake_latency=args.fake_latency, fake_token_latency=args.fake_token_latency)
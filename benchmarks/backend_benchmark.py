@@ -0,0 +1,72 @@
+""" Compare postings/sec of the inference backends on the same postings
+
+    python -m benchmarks.backend_benchmark [--backends fake,stub-ollama] [--workers 1,4] [--postings 100]
+
+fake runs FakeBackend in-process; stub-ollama sends the prompts over HTTP to
+benchmarks/stub_ollama_server.py, started on a free port with the same
+latencies; ollama and gpt4all use the real thing. Prompts are the ones
+run_csv_output.py builds, so the numbers include JSON stopping and parsing
+but not the response cache.
+"""
+import time
+import argparse
+import itertools
+from backends import load_backend, DEFAULT_OLLAMA_MODEL, DEFAULT_OLLAMA_HOST
+from inference_pool import InferenceStats, generate_outputs
+from job_store import iter_job_posts, default_input_file
+from rule_answers import QUESTION_FIELDS
+from structured_output import parse_answers
+from run_csv_output import MODEL_NAME, PROMPT_PREFIX, build_prompt
+from benchmarks.stub_ollama_server import start_server
+
+
+def run_backend(backend, backend_options, prompts, num_workers, max_tokens):
+    """ Return (seconds, generated tokens, answers parsed) for one pass over the prompts """
+    model = load_backend(backend, MODEL_NAME, **backend_options) if num_workers <= 1 else None
+    stats = InferenceStats()
+    parsed = 0
+    start = time.perf_counter()
+    outputs = generate_outputs(enumerate(prompts), max_tokens, stats, model=model, model_name=MODEL_NAME, num_workers=num_workers,
+                               prompt_prefix=PROMPT_PREFIX, structured=True, backend=backend, backend_options=backend_options)
+    for _, output in outputs:
+        parsed += parse_answers(output, QUESTION_FIELDS)[1]
+    return time.perf_counter() - start, stats.tokens, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default=None)
+    parser.add_argument('--backends', default='fake,stub-ollama', help="comma separated: fake, stub-ollama, ollama, gpt4all")
+    parser.add_argument('--workers', default='1,4', help="comma separated worker counts to try")
+    parser.add_argument('--postings', type=int, default=100)
+    parser.add_argument('--max-tokens', type=int, default=350)
+    parser.add_argument('--latency', type=float, default=0.05, help="fake backend seconds per prompt")
+    parser.add_argument('--token-latency', type=float, default=0.001, help="fake backend seconds per token")
+    parser.add_argument('--ollama-model', default=DEFAULT_OLLAMA_MODEL)
+    parser.add_argument('--ollama-host', default=DEFAULT_OLLAMA_HOST)
+    args = parser.parse_args()
+
+    job_posts = itertools.islice(iter_job_posts(args.input or default_input_file()), args.postings)
+    prompts = [build_prompt(job_details) for _, job_details in job_posts]
+    server = None
+
+    for name in args.backends.split(','):
+        options = dict(fake_latency=args.latency, fake_token_latency=args.token_latency,
+                       ollama_model=args.ollama_model, ollama_host=args.ollama_host)
+        backend = name
+        if name == 'stub-ollama':
+            if server is None:
+                server, url = start_server(latency=args.latency, token_latency=args.token_latency)
+            backend, options['ollama_host'] = 'ollama', url
+        for num_workers in (int(count) for count in args.workers.split(',')):
+            options['pool_size'] = max(num_workers, 1)
+            elapsed, tokens, parsed = run_backend(backend, options, prompts, num_workers, args.max_tokens)
+            print(f"{name:<12} workers={num_workers:<3} {len(prompts)} postings in {elapsed:.2f}s "
+                  f"({len(prompts) / elapsed:.1f} postings/sec, {tokens / elapsed:.0f} tokens/sec, {parsed} parsed)")
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
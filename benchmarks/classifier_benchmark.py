@@ -0,0 +1,76 @@
+""" Time classify_job_description against the old one-regex-per-pattern loop on job_posts.json
+
+    python -m benchmarks.classifier_benchmark [--rounds 5]
+"""
+import re
+import time
+import argparse
+from job_store import iter_job_posts
+from job_classifier import CATEGORIES, classify_job_description
+
+
+def legacy_extract_category(text, category, regex_terms):
+    for term in regex_terms:
+        match = re.search(term, text, re.IGNORECASE)
+        if match:
+            start_index = match.start()
+            end_index = text.find('\n', start_index)
+            if end_index == -1:
+                end_index = len(text)
+            return text[start_index:end_index].strip()
+    return None
+
+
+def legacy_classify_job_description(job_description):
+    """ The classifier as it was before job_classifier.py, kept for comparison """
+    classified_data = {}
+    raw_text = []
+    for category, regex_terms in CATEGORIES.items():
+        extracted_text = legacy_extract_category(job_description, category, regex_terms)
+        if extracted_text:
+            classified_data[category] = extracted_text
+        else:
+            raw_text.append(job_description)
+    if raw_text:
+        classified_data['raw'] = ' '.join(raw_text)
+    return classified_data
+
+
+def page_texts(filename):
+    """ The scraped page text of every posting, which is what the scraper classifies """
+    return [job_details.get('Additional Information') or job_details.get('Job Description', '')
+            for _, job_details in iter_job_posts(filename)]
+
+
+def timed(classify, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = [classify(text) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default='job_posts.json')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = page_texts(args.input)
+    legacy_time, legacy_results = timed(legacy_classify_job_description, texts, args.rounds)
+    new_time, new_results = timed(classify_job_description, texts, args.rounds)
+
+    # Everything but 'raw' must be identical; 'raw' now holds the text once instead of once per missing category
+    mismatches = sum({k: v for k, v in old.items() if k != 'raw'} != {k: v for k, v in new.items() if k != 'raw'}
+                     for old, new in zip(legacy_results, new_results))
+    legacy_bytes = sum(len(result.get('raw', '')) for result in legacy_results)
+    new_bytes = sum(len(result.get('raw', '')) for result in new_results)
+
+    calls = len(texts) * args.rounds
+    print(f"legacy     {calls} calls in {legacy_time:.3f}s ({1e6 * legacy_time / calls:.0f} us/call)")
+    print(f"compiled   {calls} calls in {new_time:.3f}s ({1e6 * new_time / calls:.0f} us/call)")
+    print(f"speedup    {legacy_time / new_time:.2f}x, {mismatches} postings classified differently")
+    print(f"raw text   {legacy_bytes} -> {new_bytes} characters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+""" Crawl the saved pages in fixtures/indeed_site with ScrapeEngine and check what it found, without a browser
+
+    python -m benchmarks.engine_check
+
+The pages are served on a local port and loaded by FixtureDriver, a stand-in
+for the Firefox driver that fetches them with urllib and finds their links
+with html.parser. The checks crawl every posting once, crawl again with those
+postings already known, crawl two search terms with the same results, and
+crawl with a classifier that fails on one page. Exits with 1 if any check fails.
+"""
+import sys
+import threading
+import urllib.parse
+import urllib.request
+from html.parser import HTMLParser
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+from dedup import normalize_job_url
+from http_fetch import JobPageParser
+from job_classifier import classify_job_description
+from scrape_engine import ScrapeEngine
+from benchmarks.fetch_benchmark import serve_fixtures, job_page_paths
+
+NEXT_PAGE_XPATH = "//a[@data-testid='pagination-page-next']"
+
+
+class LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self.links.append(dict(attrs))
+
+
+class FixtureElement:
+    def __init__(self, attrs=None, text=''):
+        self.attrs = attrs or {}
+        self.text = text
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+
+class FixtureDriver:
+    """ Just enough of a Selenium driver for ScrapeEngine: get(), the page's links and its body text """
+
+    def __init__(self, headless=True):
+        self.url = None
+        self.html = ''
+
+    def get(self, url):
+        with urllib.request.urlopen(url, timeout=10) as response:
+            self.html = response.read().decode('utf-8')
+        self.url = url
+
+    def _links(self):
+        parser = LinkParser()
+        parser.feed(self.html)
+        # Like the browser, hand out absolute URLs
+        return [FixtureElement({**attrs, 'href': urllib.parse.urljoin(self.url, attrs['href'])} if attrs.get('href') else attrs)
+                for attrs in parser.links]
+
+    def find_elements(self, by, value):
+        return self._links() if (by, value) == (By.XPATH, '//a') else []
+
+    def find_element(self, by, value):
+        if by == By.TAG_NAME and value == 'body':
+            parser = JobPageParser()
+            parser.feed(self.html)
+            return FixtureElement(text=parser.text())
+        if (by, value) == (By.XPATH, NEXT_PAGE_XPATH):
+            for link in self._links():
+                if link.get_attribute('data-testid') == 'pagination-page-next':
+                    return link
+        raise NoSuchElementException(f"{value} not found on {self.url}")
+
+    def quit(self):
+        pass
+
+
+def crawl(base_url, search_terms, classify=classify_job_description, known=frozenset(), num_drivers=2, timeout=60):
+    """ Run one crawl of the fixtures; returns the engine and the job URLs it wrote, or raises if it does not finish """
+    postings = []
+    engine = ScrapeEngine(search_terms, 'Atlanta, GA', 100, classify, lambda href, data: postings.append(href),
+                          num_drivers=num_drivers, min_interval=0, search_url=f"{base_url}/jobs.html?q={{query}}&l={{location}}",
+                          job_link_prefix=f"{base_url}/rc/clk", driver_factory=FixtureDriver,
+                          known=known, stop_when_stale=bool(known))
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise RuntimeError(f"the crawl did not finish within {timeout}s")
+    return engine, postings
+
+
+def main():
+    expected = len(job_page_paths())
+    server, base_url = serve_fixtures()
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"{'ok' if ok else 'FAILED':<7} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        _, postings = crawl(base_url, ['software'])
+        keys = {normalize_job_url(href) for href in postings}
+        check('crawl', len(postings) == len(keys) == expected,
+              f"{len(postings)} postings, {expected} job pages in the fixtures")
+
+        engine, postings = crawl(base_url, ['software'], known=frozenset(keys))
+        check('known postings', not postings and engine.stats.stale_pages == 1,
+              f"{len(postings)} postings, {engine.stats.stale_pages} searches stopped as stale")
+
+        # One driver, so the second term's first page only has links the first term already found
+        engine, postings = crawl(base_url, ['software', 'developer'], known=frozenset({'unrelated'}), num_drivers=1)
+        check('overlapping terms', len(postings) == expected and engine.stats.stale_pages == 0,
+              f"{len(postings)} postings, {engine.stats.stale_pages} searches stopped as stale")
+
+        calls = []
+        lock = threading.Lock()
+
+        def flaky_classify(text):
+            with lock:
+                calls.append(text)
+                if len(calls) == 1:
+                    raise ValueError("classifier failed")
+            return classify_job_description(text)
+
+        # One driver, so a worker thread dying on the error would leave the crawl hanging
+        _, postings = crawl(base_url, ['software'], classify=flaky_classify, num_drivers=1, timeout=20)
+        check('failing classifier', len(postings) == expected - 1,
+              f"{len(postings)} postings with the classifier failing on one page")
+    except RuntimeError as e:
+        check('crawl finished', False, str(e))
+    finally:
+        server.shutdown()
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
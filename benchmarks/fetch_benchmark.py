@@ -0,0 +1,87 @@
+""" Compare the HTTP and Selenium paths for job pages on the saved pages in fixtures/indeed_site
+
+    python -m benchmarks.fetch_benchmark [--rounds 5] [--skip-browser]
+"""
+import os
+import glob
+import time
+import argparse
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from http_fetch import HttpJobFetcher, extract_job_text
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'indeed_site')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures():
+    """ Serve the saved pages on a free local port, returning the server and its base URL """
+    handler = functools.partial(QuietHandler, directory=SITE_DIR)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def job_page_paths():
+    return sorted(os.path.relpath(path, SITE_DIR) for path in glob.glob(os.path.join(SITE_DIR, 'rc', 'clk', '*.html')))
+
+
+def report(name, pages, elapsed):
+    print(f"{name:<10} {pages} pages in {elapsed:.3f}s ({pages / elapsed:.1f} pages/sec, {1000 * elapsed / pages:.1f} ms/page)")
+
+
+def bench_parse(paths, rounds):
+    documents = [open(os.path.join(SITE_DIR, path), encoding='utf-8').read() for path in paths]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for document in documents:
+            extract_job_text(document)
+    report('parse', len(documents) * rounds, time.perf_counter() - start)
+
+
+def bench_http(base_url, paths, rounds):
+    fetcher = HttpJobFetcher()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            assert fetcher.fetch(f"{base_url}/{path}") is not None
+    report('http', len(paths) * rounds, time.perf_counter() - start)
+    fetcher.close()
+
+
+def bench_browser(base_url, paths, rounds):
+    from scrape_engine import make_driver, get_job_text
+    driver = make_driver(headless=True)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            driver.get(f"{base_url}/{path}")
+            assert get_job_text(driver) is not None
+    report('selenium', len(paths) * rounds, time.perf_counter() - start)
+    driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--skip-browser', action='store_true', help="only time the HTTP path")
+    args = parser.parse_args()
+
+    paths = job_page_paths()
+    server, base_url = serve_fixtures()
+    try:
+        bench_parse(paths, args.rounds)
+        bench_http(base_url, paths, args.rounds)
+        if not args.skip_browser:
+            bench_browser(base_url, paths, args.rounds)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
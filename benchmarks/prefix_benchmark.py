@@ -0,0 +1,66 @@
+""" Compare per-posting latency with and without reusing the evaluated instruction prefix
+
+    python -m benchmarks.prefix_benchmark [--postings 10] [--max-tokens 64] [--threads N]
+
+Needs gpt4all and the model used by run_csv_output.py. Both passes run the
+same prompts on the same model; the first posting of the reuse pass also pays
+for evaluating the prefix.
+"""
+import time
+import argparse
+import itertools
+import statistics
+from gpt4all import GPT4All
+from job_store import iter_job_posts, default_input_file
+from prefix_cache import PrefixCachedModel
+from prompt_compaction import PromptCompactor
+from run_csv_output import MODEL_NAME, PROMPT_PREFIX, build_prompt
+
+
+def time_generation(model, prompt, max_tokens):
+    """ Return (seconds to the first token, seconds for the whole answer) """
+    start = time.perf_counter()
+    first_token = None
+    for _ in model.generate(prompt, max_tokens=max_tokens, streaming=True):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_token if first_token is not None else total, total
+
+
+def run_pass(name, model, prompts, max_tokens):
+    first_tokens, totals = [], []
+    for prompt in prompts:
+        first_token, total = time_generation(model, prompt, max_tokens)
+        first_tokens.append(first_token)
+        totals.append(total)
+    print(f"{name:<14} time to first token: mean {statistics.mean(first_tokens):.2f}s, median {statistics.median(first_tokens):.2f}s | "
+          f"per posting: mean {statistics.mean(totals):.2f}s, median {statistics.median(totals):.2f}s")
+    return statistics.mean(first_tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default=None)
+    parser.add_argument('--postings', type=int, default=10)
+    parser.add_argument('--max-tokens', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--prompt-token-budget', type=int, default=1000)
+    args = parser.parse_args()
+
+    compactor = PromptCompactor(build_prompt, args.prompt_token_budget)
+    job_posts = itertools.islice(iter_job_posts(args.input or default_input_file()), args.postings)
+    prompts = [compactor.prompt(job_url, job_details) for job_url, job_details in job_posts]
+    model = GPT4All(MODEL_NAME, n_threads=args.threads)
+
+    full = run_pass('full prompt', model, prompts, args.max_tokens)
+    cached_model = PrefixCachedModel(model, PROMPT_PREFIX)
+    reused = run_pass('prefix reuse', cached_model, prompts, args.max_tokens)
+    if cached_model.llmodel is None:
+        print("These gpt4all bindings do not expose the prompt context; the prefix was not reused")
+    else:
+        print(f"Prefix is {cached_model.prefix_tokens} tokens; time to first token {full / max(reused, 1e-9):.2f}x faster with reuse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+""" A local server that speaks enough of Ollama's /api/generate to test the ollama backend without a model
+
+    python -m benchmarks.stub_ollama_server [--port 11434] [--latency 0.5] [--token-latency 0.01]
+
+Answers come from FakeBackend, so they are the same for the same prompt, and
+are streamed one piece per line like Ollama does. Requests are served on
+their own threads, so concurrent clients overlap like they would on a real
+server with spare capacity.
+"""
+import json
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from backends import FakeBackend
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    backend = FakeBackend()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        max_tokens = request.get('options', {}).get('num_predict', 128)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for piece in self.backend.generate(request['prompt'], max_tokens=max_tokens, streaming=True):
+                self._write_chunk({'model': request['model'], 'response': piece, 'done': False})
+            self._write_chunk({'model': request['model'], 'response': '', 'done': True})
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. once it had a complete JSON answer
+            self.close_connection = True
+
+    def _write_chunk(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+def start_server(port=0, latency=0.0, token_latency=0.0):
+    """ Serve in a background thread, returning the server and its base URL """
+    handler = type('Handler', (StubOllamaHandler,), {'backend': FakeBackend(latency, token_latency)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--token-latency', type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.latency, args.token_latency)
+    print(f"Stub Ollama server on {url}; Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+""" Time every CPU-bound step of the run scripts on the checked-in data and write the results as JSON
+
+    python -m benchmarks.suite [--rounds 5] [--output benchmark_results.json] [--profile cprofile] [--compare old_results.json]
+
+Replays job_posts.json (300 postings) and the sample_job_results*.csv files
+through loading, classification, prompt rendering and compaction, the rule
+answers, de-duplication, output parsing and CSV writing, then runs
+run_csv_output.process_jobs end to end against the fake backend
+(--fake-latency / --fake-token-latency seconds per prompt / token).
+
+Each benchmark reports its best, median and mean time over --rounds, and the
+JSON also records the commit and Python version, so results from two
+versions can be compared: --compare exits with 1 when any benchmark is more
+than --tolerance slower than in the older file. --profile writes one
+cProfile (.prof) or pyinstrument (.html) dump per benchmark to --profile-dir.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from backends import FakeBackend, DEFAULT_N_CTX
+from dedup import mark_duplicates
+from job_classifier import classify_job_description
+from job_store import JobPostWriter, iter_job_posts
+from prompt_compaction import PromptCompactor, context_token_budget
+from rule_answers import QUESTION_FIELDS, answer_with_rules
+from run_journal import RunJournal
+from structured_output import JsonObjectEnd, parse_answers
+from benchmarks.classifier_benchmark import page_texts
+import run
+import run_csv_output
+import run_full_input_csv_output
+
+SAMPLE_RESULTS = ['sample_job_results.csv', 'sample_job_results_phi3_mini.csv']
+
+
+class BenchmarkData:
+    """ Inputs shared by every benchmark, loaded and written to a scratch directory once """
+
+    def __init__(self, input_file, sample_files, workdir, fake_latency=0.0, fake_token_latency=0.0):
+        self.input_file = input_file
+        self.workdir = workdir
+        self.fake_latency = fake_latency
+        self.fake_token_latency = fake_token_latency
+        self.job_posts = list(iter_job_posts(input_file))
+        self.page_texts = page_texts(input_file)
+        self.jsonl_file = os.path.join(workdir, 'job_posts.jsonl')
+        writer = JobPostWriter(self.jsonl_file, mode='w')
+        for job_url, job_details in self.job_posts:
+            writer.write(job_url, job_details)
+        writer.close()
+
+        self.sample_rows = []
+        for filename in sample_files:
+            with open(filename, 'r', newline='', encoding='utf-8') as file:
+                self.sample_rows.extend(csv.DictReader(file))
+        # The answers the sample runs got, as the JSON the model is now asked for, followed by the prose it tends to add
+        self.replies = [json.dumps({field: row.get(field, '') for field in QUESTION_FIELDS}) + ' I hope this helps!'
+                        for row in self.sample_rows]
+        self.csv_header = list(self.sample_rows[0].keys()) if self.sample_rows else []
+
+
+def bench_load_json(data):
+    return sum(1 for _ in iter_job_posts(data.input_file))
+
+
+def bench_load_jsonl(data):
+    return sum(1 for _ in run_csv_output.load_data(data.jsonl_file))
+
+
+def bench_classify(data):
+    for text in data.page_texts:
+        classify_job_description(text)
+    return len(data.page_texts)
+
+
+def bench_render_prompts(data):
+    for _, job_details in data.job_posts:
+        run.build_prompt(job_details)
+        run_csv_output.build_prompt(job_details)
+        run_full_input_csv_output.build_prompt(job_details)
+    return 3 * len(data.job_posts)
+
+
+def bench_compact_prompts(data):
+    compactor = PromptCompactor(run_full_input_csv_output.build_prompt,
+                                context_token_budget(DEFAULT_N_CTX, run_full_input_csv_output.MAX_TOKENS), fields=None)
+    for job_url, job_details in data.job_posts:
+        compactor.prompt(job_url, job_details)
+    return len(data.job_posts)
+
+
+def bench_rules(data):
+    for _, job_details in data.job_posts:
+        answer_with_rules(job_details)
+    return len(data.job_posts)
+
+
+def bench_dedup(data):
+    return sum(1 for _ in mark_duplicates(data.job_posts))
+
+
+def bench_parse_outputs(data):
+    for reply in data.replies:
+        stop = JsonObjectEnd()
+        for index, piece in enumerate(reply.split(' ')):
+            if stop(index, piece + ' ') is False:
+                break
+        parse_answers(reply, QUESTION_FIELDS)
+        run_full_input_csv_output.build_row('', reply)
+    return len(data.replies)
+
+
+def bench_write_csv(data):
+    filename = os.path.join(data.workdir, 'write_csv.sqlite')
+    journal = RunJournal('benchmark', filename)
+    journal.reset()
+    for row in data.sample_rows:
+        journal.record(row['Job URL'], 'model', row.get('Raw Output', ''), list(row.values()))
+    journal.export_csv(os.path.join(data.workdir, 'job_results.csv'), data.csv_header)
+    journal.close()
+    return len(data.sample_rows)
+
+
+def bench_process_jobs(data):
+    """ run_csv_output.process_jobs on every posting with the fake model, in the scratch directory """
+    journal = RunJournal('run_csv_output', os.path.join(data.workdir, 'process_jobs.sqlite'))
+    journal.reset()
+    model = FakeBackend(data.fake_latency, data.fake_token_latency)
+    job_posts = mark_duplicates(run_csv_output.load_data(data.jsonl_file))
+    cwd = os.getcwd()
+    os.chdir(data.workdir)
+    try:
+        run_csv_output.process_jobs(job_posts, model, journal, context_token_budget(DEFAULT_N_CTX, run_csv_output.MAX_TOKENS),
+                                    backend='fake')
+    finally:
+        os.chdir(cwd)
+        journal.close()
+    return len(data.job_posts)
+
+
+BENCHMARKS = {
+    'load_json': bench_load_json,
+    'load_jsonl': bench_load_jsonl,
+    'classify': bench_classify,
+    'render_prompts': bench_render_prompts,
+    'compact_prompts': bench_compact_prompts,
+    'rules': bench_rules,
+    'dedup': bench_dedup,
+    'parse_outputs': bench_parse_outputs,
+    'write_csv': bench_write_csv,
+    'process_jobs': bench_process_jobs,
+}
+
+
+def quietly(benchmark, data):
+    """ Run one benchmark with the progress lines the run scripts print thrown away """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return benchmark(data)
+
+
+def time_benchmark(benchmark, data, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        items = quietly(benchmark, data)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'items': items,
+        'rounds': rounds,
+        'best_seconds': best,
+        'median_seconds': statistics.median(times),
+        'mean_seconds': statistics.mean(times),
+        'us_per_item': 1e6 * best / items if items else None,
+    }
+
+
+def profile_benchmark(name, benchmark, data, profiler, profile_dir):
+    """ Run the benchmark once more under the profiler and return the dump's filename """
+    os.makedirs(profile_dir, exist_ok=True)
+    if profiler == 'cprofile':
+        import cProfile
+        profile = cProfile.Profile()
+        profile.runcall(quietly, benchmark, data)
+        filename = os.path.join(profile_dir, f"{name}.prof")
+        profile.dump_stats(filename)
+        return filename
+
+    from pyinstrument import Profiler
+    profile = Profiler()
+    profile.start()
+    try:
+        quietly(benchmark, data)
+    finally:
+        profile.stop()
+    filename = os.path.join(profile_dir, f"{name}.html")
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write(profile.output_html())
+    return filename
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file, tolerance):
+    """ Print the change against an older results file and return the names of the benchmarks that got slower """
+    with open(baseline_file, 'r') as file:
+        baseline = json.load(file)
+    print(f"Compared with {baseline_file} (commit {baseline['meta'].get('commit')}):")
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            continue
+        ratio = result['best_seconds'] / max(old['best_seconds'], 1e-9)
+        slower = ratio > 1 + tolerance
+        if slower:
+            regressions.append(name)
+        print(f"  {name:<16} {old['best_seconds']:.4f}s -> {result['best_seconds']:.4f}s ({ratio:.2f}x){'  SLOWER' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='job_posts.json')
+    parser.add_argument('--samples', default=','.join(SAMPLE_RESULTS), help="comma separated result CSVs to replay")
+    parser.add_argument('--only', default=None, help="comma separated benchmarks to run: " + ', '.join(BENCHMARKS))
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--fake-latency', type=float, default=0.0, help="seconds the fake model waits per prompt in process_jobs")
+    parser.add_argument('--fake-token-latency', type=float, default=0.0, help="seconds the fake model waits per token in process_jobs")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None)
+    parser.add_argument('--profile-dir', default='benchmark_profiles')
+    parser.add_argument('--compare', default=None, help="results file from an earlier version to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="slowdown that counts as a regression with --compare")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix='job_benchmarks_')
+    try:
+        data = BenchmarkData(args.input, args.samples.split(','), workdir, args.fake_latency, args.fake_token_latency)
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'postings': len(data.job_posts),
+                'sample_rows': len(data.sample_rows),
+                'fake_latency': args.fake_latency,
+                'fake_token_latency': args.fake_token_latency,
+            },
+            'benchmarks': {},
+        }
+        for name in names:
+            result = time_benchmark(BENCHMARKS[name], data, args.rounds)
+            if args.profile:
+                result['profile'] = profile_benchmark(name, BENCHMARKS[name], data, args.profile, args.profile_dir)
+            results['benchmarks'][name] = result
+            print(f"{name:<16} {result['items']:>4} items  best {result['best_seconds']:.4f}s  "
+                  f"median {result['median_seconds']:.4f}s  ({result['us_per_item'] or 0:.0f} us/item)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"Slower than {args.compare} by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import itertools
+import importlib.util
+
+# Columns with few distinct values, stored once per row group and referenced by index
+DICTIONARY_COLUMNS = ['Company Name', 'Location', 'Job Type', 'Position Type', 'Job Location', 'Security Clearance', 'Answer Source']
+
+
+def write_parquet(filename, header, rows, batch_rows=1000, compression='zstd'):
+    """ Write rows under the CSV header to a Parquet file, batch_rows at a time; returns the number of rows
+
+    Every column is a string column named after its CSV column, so queries
+    read only the columns they need. Rows are converted to Arrow record batches
+    batch_rows at a time, and each batch becomes one row group. The short,
+    repetitive columns are dictionary encoded; the descriptions and raw model
+    output are only compressed. Like the CSV, the file is written to a
+    temporary name and moved into place once it is complete. Needs pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in header])
+    temp_filename = filename + '.tmp'
+    written = 0
+    writer = pq.ParquetWriter(temp_filename, schema, compression=compression,
+                              use_dictionary=[column for column in DICTIONARY_COLUMNS if column in header])
+    try:
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_rows))
+            if not batch:
+                break
+            # Rows imported from older CSVs can have fewer or more cells than the header
+            columns = [pa.array([_cell(row, index) for row in batch], pa.string()) for index in range(len(header))]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+            written += len(batch)
+    except BaseException:
+        writer.close()
+        os.remove(temp_filename)
+        raise
+    writer.close()
+    os.replace(temp_filename, filename)
+    return written
+
+
+def _cell(row, index):
+    if index >= len(row) or row[index] is None:
+        return None
+    return str(row[index])
+
+
+def add_parquet_arguments(parser):
+    parser.add_argument('--parquet', default=None,
+                        help="also write the results to this Parquet file from the journal when the run ends (needs pyarrow)")
+
+
+def parquet_file_from_args(args):
+    """ The --parquet file, checking up front that pyarrow is there so a long run does not fail at the end """
+    if args.parquet and importlib.util.find_spec('pyarrow') is None:
+        raise SystemExit("--parquet needs pyarrow: pip install pyarrow")
+    return args.parquet
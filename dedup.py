@@ -0,0 +1,157 @@
+import re
+import hashlib
+import urllib.parse
+
+
+def job_key(job_url):
+    """ Return Indeed's jk job key for a posting URL, or None if it has none """
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(job_url).query)
+    return query.get('jk', [None])[0]
+
+
+def normalize_job_url(job_url):
+    """ Reduce the many rc/clk tracking URLs of a posting to one canonical URL """
+    key = job_key(job_url)
+    return f"https://www.indeed.com/viewjob?jk={key}" if key else job_url
+
+
+def posting_text(job_details):
+    """ Text used to compare postings; the description, or the whole page when it was not split out """
+    return job_details.get('Job Description') or job_details.get('Additional Information') or ' '.join(map(str, job_details.values()))
+
+
+def posting_identity(job_details):
+    """ Job title and company, which must match for two postings to share answers
+
+    Agencies post one description template for many roles, changing only the
+    title, so similar descriptions alone do not make the same job.
+    """
+    return tuple(' '.join(str(job_details.get(field) or '').lower().split()) for field in ('Job Title', 'Company Name'))
+
+
+def _hash64(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def shingles(text, size=5):
+    """ 64-bit hashes of the word n-grams of the text """
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= size:
+        return {_hash64(' '.join(words))}
+    return {_hash64(' '.join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(hashes, num_perm):
+    """ One-permutation MinHash: split the hash space into num_perm bins and keep the minimum of each
+
+    Empty bins borrow the value of the next non-empty bin (rotation densification), so
+    short texts still get a full signature from a single pass over their shingles.
+    """
+    signature = [None] * num_perm
+    for h in hashes:
+        slot, value = h % num_perm, h // num_perm
+        if signature[slot] is None or value < signature[slot]:
+            signature[slot] = value
+    for slot in range(num_perm):
+        if signature[slot] is None:
+            for distance in range(1, num_perm):
+                donor = signature[(slot + distance) % num_perm]
+                if donor is not None:
+                    signature[slot] = (donor, distance)
+                    break
+    return signature
+
+
+def lsh_params(threshold, num_perm):
+    """ Pick (bands, rows) so that pairs above the Jaccard threshold are likely to share a bucket """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """ Incremental MinHash/LSH index that maps each posting to the first near-identical one seen
+
+    Postings only count as duplicates when their job title and company match
+    too (see posting_identity).
+    """
+
+    def __init__(self, threshold=0.9, num_perm=128, shingle_size=5):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = {}
+        self.identities = {}
+        self.representative_of_key = {}
+
+    def signature(self, text):
+        return minhash_signature(shingles(text, self.shingle_size), self.num_perm)
+
+    def add(self, job_url, job_details):
+        """ Index a posting and return the URL of the earlier posting it duplicates, or None """
+        key = job_key(job_url) or job_url
+        if key in self.representative_of_key:
+            return self.representative_of_key[key]
+
+        signature = self.signature(posting_text(job_details))
+        identity = posting_identity(job_details)
+        bands = [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+        candidates = []
+        for bucket, band in zip(self.buckets, bands):
+            candidates.extend(bucket.get(band, ()))
+        for candidate in dict.fromkeys(candidates):
+            if self.identities[candidate] != identity:
+                continue
+            other = self.signatures[candidate]
+            similarity = sum(x == y for x, y in zip(signature, other)) / len(signature)
+            if similarity >= self.threshold:
+                self.representative_of_key[key] = candidate
+                return candidate
+
+        # New representative: only these are kept in the index
+        self.representative_of_key[key] = job_url
+        self.signatures[job_url] = signature
+        self.identities[job_url] = identity
+        for bucket, band in zip(self.buckets, bands):
+            bucket.setdefault(band, []).append(job_url)
+        return None
+
+
+def mark_duplicates(job_posts, threshold=0.9):
+    """ Tag each (job_url, job_details) pair with the earlier posting it duplicates
+
+    Yields (job_url, job_details, representative_url), where representative_url
+    is None for the first posting of each near-duplicate group. Only the model
+    needs to see those; the rest reuse their representative's answers. With a
+    threshold of None every posting is passed through as its own representative.
+    """
+    if threshold is None:
+        for job_url, job_details in job_posts:
+            yield job_url, job_details, None
+        return
+
+    index = NearDuplicateIndex(threshold)
+    unique = skipped = 0
+    for job_url, job_details in job_posts:
+        representative = index.add(job_url, job_details)
+        if representative is None:
+            unique += 1
+        else:
+            skipped += 1
+        yield job_url, job_details, representative
+
+    print(f"Found {skipped} duplicate postings; ran the model on {unique} postings")
+
+
+def add_dedup_arguments(parser):
+    parser.add_argument('--dedup-threshold', type=float, default=0.9, help="Jaccard similarity above which two job descriptions count as the same posting")
+    parser.add_argument('--no-dedup', action='store_true', help="run the model on every posting, even near-identical ones")
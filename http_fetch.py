@@ -0,0 +1,91 @@
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:126.0) Gecko/20100101 Firefox/126.0"
+
+# Tags that start a new line in the rendered text, like the browser's body.text
+BLOCK_TAGS = {'p', 'div', 'br', 'li', 'ul', 'ol', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'tr', 'table',
+              'section', 'article', 'header', 'footer', 'nav', 'main'}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+VOID_TAGS = {'br', 'img', 'hr', 'input', 'meta', 'link', 'source', 'wbr'}
+
+
+class JobPageParser(HTMLParser):
+    """ Single pass over a job page collecting its visible text and whether it has a job description """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.description_depth = 0
+        self.description_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+        if tag in VOID_TAGS:
+            return
+        if self.description_depth:
+            self.description_depth += 1
+        elif ('id', 'jobDescriptionText') in attrs:
+            self.description_depth = 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+        if self.description_depth and tag not in VOID_TAGS:
+            self.description_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self.parts.append(data)
+        if self.description_depth:
+            self.description_chars += len(data.strip())
+
+    def text(self):
+        lines = (' '.join(line.split()) for line in ''.join(self.parts).split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+
+def extract_job_text(html):
+    """ Return the visible text of a job page, or None if it has no job description in its static HTML """
+    parser = JobPageParser()
+    parser.feed(html)
+    parser.close()
+    if not parser.description_chars:
+        return None
+    return parser.text()
+
+
+class HttpJobFetcher:
+    """ Fetches job pages over a keep-alive connection pool, without a browser
+
+    One fetcher per thread; connections to each host are reused between pages.
+    """
+
+    def __init__(self, pool_size=4, timeout=15):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url):
+        """ Return the job text for url, or None when the static page does not have it """
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        return extract_job_text(response.text)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,287 @@
+import os
+import time
+import collections
+import threading
+import multiprocessing
+import multiprocessing.pool
+from response_cache import ResponseCache
+from backends import THREADED_BACKENDS, load_backend, backend_model_name, add_backend_arguments, backend_options_from_args
+from prefix_cache import PrefixCachedModel
+from structured_output import JsonObjectEnd, RETRY_REMINDER, parse_answers, parse_json_object, requested_fields
+from prompt_compaction import estimate_tokens
+from telemetry import peak_rss_mb
+
+# Model owned by the current pool worker (a process, or a thread for the HTTP and fake backends)
+_worker = threading.local()
+
+
+class InferenceStats:
+    """ Aggregate throughput counters for a run over many postings """
+
+    def __init__(self):
+        self.postings = 0
+        self.tokens = 0
+        self.cache_hits = 0
+        self.start_time = time.perf_counter()
+
+    def record(self, tokens):
+        self.postings += 1
+        self.tokens += tokens
+
+    def record_cache_hit(self):
+        self.postings += 1
+        self.cache_hits += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def report(self):
+        elapsed = max(self.elapsed(), 1e-9)
+        print(f"Processed {self.postings} postings in {elapsed:.1f}s "
+              f"({self.postings / elapsed:.2f} postings/sec, {self.tokens / elapsed:.2f} tokens/sec, {self.cache_hits} from cache)")
+
+
+def add_inference_arguments(parser):
+    """ Command line options shared by all of the run scripts """
+    parser.add_argument('--workers', type=int, default=1, help="number of model processes to run in parallel")
+    parser.add_argument('--threads-per-worker', type=int, default=None, help="CPU threads per model (default: cores / workers)")
+    parser.add_argument('--cache', default='llm_cache.sqlite', help="SQLite file used to cache model responses")
+    parser.add_argument('--cache-size-mb', type=int, default=512, help="evict the least recently used responses above this size")
+    parser.add_argument('--no-cache', action='store_true', help="always run the model, even for prompts seen before")
+    parser.add_argument('--no-prefix-reuse', action='store_true', help="evaluate the whole prompt for every posting instead of reusing the instruction prefix")
+    add_backend_arguments(parser)
+
+
+def inference_options_from_args(args):
+    """ Turn the parsed command line options into keyword arguments for generate_outputs """
+    cache = None if args.no_cache else ResponseCache(args.cache, args.cache_size_mb * 1024 * 1024)
+    return dict(num_workers=args.workers, threads_per_worker=args.threads_per_worker, cache=cache, reuse_prefix=not args.no_prefix_reuse,
+                backend=args.backend, backend_options=backend_options_from_args(args))
+
+
+def default_threads_per_worker(num_workers):
+    """ Split the available cores evenly between the workers """
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
+
+def _llmodel(model):
+    """ The gpt4all LLModel behind model (GPT4All or PrefixCachedModel), or None for the other backends """
+    for _ in range(3):
+        if hasattr(model, 'prompt_model'):
+            return model
+        model = getattr(model, 'model', None)
+    return None
+
+
+def _counting_prompt_tokens(llmodel, callback, timing):
+    """ Wrap a generation callback so timing gets the prompt's token count from the model's context """
+    def on_token(token_id, response):
+        context = getattr(llmodel, 'context', None)
+        if 'prompt_tokens' not in timing and context is not None:
+            # gpt4all evaluates each token before handing it over, so the first one is already in n_past
+            timing['prompt_tokens'] = context.n_past - 1
+        return callback(token_id, response) if callback is not None else True
+    return on_token
+
+
+def generate_with_stats(model, prompt, max_tokens, generation_params=None, stop=None, timing=None):
+    """ Stream a generation from the model and count the tokens it produced
+
+    stop is a callback class; a fresh instance sees every token and ends the
+    generation early by returning False. timing, if given, is a dict that gets
+    the seconds to the first token and the seconds spent generating added to
+    it, so it can be passed to several generations for one posting. With
+    gpt4all it also gets the prompt tokens of the first generation, as counted
+    by the model's tokenizer.
+    """
+    params = dict(generation_params or {})
+    if stop is not None:
+        params['callback'] = stop()
+    llmodel = _llmodel(model) if timing is not None else None
+    if llmodel is not None:
+        params['callback'] = _counting_prompt_tokens(llmodel, params.get('callback'), timing)
+    pieces = []
+    start = time.perf_counter()
+    for token in model.generate(prompt, max_tokens=max_tokens, streaming=True, **params):
+        if timing is not None and 'first_token_seconds' not in timing:
+            timing['first_token_seconds'] = timing.get('seconds', 0.0) + time.perf_counter() - start
+        pieces.append(token)
+    if timing is not None:
+        timing['seconds'] = timing.get('seconds', 0.0) + time.perf_counter() - start
+    return ''.join(pieces), len(pieces)
+
+
+def _complete_json(output, fields):
+    """ Whether output has a JSON object answering every field the prompt asked for """
+    if fields is None:
+        return parse_json_object(output) is not None
+    return parse_answers(output, fields)[1]
+
+
+def generate_json(model, prompt, max_tokens, generation_params=None, timing=None):
+    """ Generate until the first JSON object is closed, retrying once without sampling if it is missing or incomplete
+
+    The keys to expect are read from the prompt's json_instructions. The retry
+    is kept if it answers every key, or if it is JSON and the first reply was not.
+    """
+    fields = requested_fields(prompt)
+    output, tokens = generate_with_stats(model, prompt, max_tokens, generation_params, stop=JsonObjectEnd, timing=timing)
+    if not _complete_json(output, fields):
+        retry_params = dict(generation_params or {}, temp=0)
+        retry_output, retry_tokens = generate_with_stats(model, prompt + RETRY_REMINDER, max_tokens, retry_params,
+                                                         stop=JsonObjectEnd, timing=timing)
+        tokens += retry_tokens
+        first_is_json = parse_json_object(output) is not None
+        if _complete_json(retry_output, fields) or (not first_is_json and parse_json_object(retry_output) is not None):
+            output = retry_output
+    return output, tokens
+
+
+def _init_worker(backend, model_name, n_threads, slot_counter, prompt_prefix, backend_options):
+    """ Load one model per worker, pinned to its own slice of cores when the OS allows it """
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+    if n_threads and hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        start = (slot * n_threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(min(n_threads, len(cpus)))})
+    _worker.model = load_backend(backend, model_name, n_threads, **backend_options)
+    if prompt_prefix:
+        _worker.model = PrefixCachedModel(_worker.model, prompt_prefix)
+
+
+def generation_metrics(prompt, tokens, timing):
+    """ The telemetry for one generation, measured in the process that ran it
+
+    prompt_tokens is the model's own count; backends that do not report one
+    get prompt_tokens_estimate (see estimate_tokens) instead.
+    """
+    seconds = timing.get('seconds', 0.0)
+    if 'prompt_tokens' in timing:
+        prompt_count = {'prompt_tokens': timing['prompt_tokens']}
+    else:
+        prompt_count = {'prompt_tokens_estimate': estimate_tokens(prompt)}
+    return {
+        **prompt_count,
+        'generated_tokens': tokens,
+        'first_token_seconds': timing.get('first_token_seconds'),
+        'seconds': seconds,
+        'tokens_per_second': tokens / seconds if seconds > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _generate_timed(model, prompt, max_tokens, generation_params, structured):
+    """ Return (output, tokens, metrics) for one prompt """
+    generate = generate_json if structured else generate_with_stats
+    timing = {}
+    output, tokens = generate(model, prompt, max_tokens, generation_params, timing=timing)
+    return output, tokens, generation_metrics(prompt, tokens, timing)
+
+
+def _generate_task(prompt, max_tokens, generation_params, structured):
+    return _generate_timed(_worker.model, prompt, max_tokens, generation_params, structured)
+
+
+class _Done:
+    """ Stand-in for an AsyncResult whose value is already known """
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def generate_outputs(items, max_tokens, stats, model=None, model_name=None, num_workers=1, threads_per_worker=None,
+                     cache=None, generation_params=None, prompt_prefix=None, reuse_prefix=True, structured=False,
+                     backend='gpt4all', backend_options=None, with_metrics=False):
+    """ Yield (payload, generated_output) for each (payload, prompt) item, in input order
+
+    With a single worker the already loaded model is used in-process. With more
+    workers, each process loads its own copy of model_name and pulls prompts
+    from the pool's shared task queue; the ollama and fake backends only wait
+    on I/O, so their workers are threads with one client each. When a ResponseCache is given it is
+    consulted before any prompt reaches a model, and identical prompts that are
+    still in flight share one generation. Items with a prompt of None are
+    passed through with no output, keeping their place in the order.
+
+    Prompts that start with prompt_prefix only evaluate the prefix once per
+    model; the rest of each prompt is run on top of its saved KV cache.
+
+    With structured=True the prompts ask for a JSON object: generation stops
+    once it is closed, and a reply without one or missing some of its keys is
+    retried once. Replies that are still not JSON are not cached.
+
+    With with_metrics=True, (payload, generated_output, metrics) is yielded
+    instead, where metrics holds the tokens, latencies and peak memory of the
+    generation (see generation_metrics), or None when no model ran.
+    """
+    if not reuse_prefix:
+        prompt_prefix = None
+    if model is not None and prompt_prefix:
+        model = PrefixCachedModel(model, prompt_prefix)
+    backend_options = backend_options or {}
+    pool = None
+    if num_workers > 1:
+        slot_counter = multiprocessing.Value('i', 0)
+        if backend in THREADED_BACKENDS:
+            pool_class, n_threads = multiprocessing.pool.ThreadPool, None
+        else:
+            pool_class, n_threads = multiprocessing.Pool, threads_per_worker or default_threads_per_worker(num_workers)
+        pool = pool_class(num_workers, initializer=_init_worker,
+                          initargs=(backend, model_name, n_threads, slot_counter, prompt_prefix, backend_options))
+    # Responses from different backends are cached apart
+    cache_model_name = backend_model_name(backend, model_name, **backend_options)
+
+    # Results are handed back in submission order; keep a few prompts queued per worker
+    window = 2 * num_workers if pool else 0
+    pending = collections.deque()
+    in_flight = {}
+
+    def finish(entry):
+        payload, key, result, from_cache = entry
+        if result is None:
+            return (payload, None, None) if with_metrics else (payload, None)
+        # The cache holds (output, tokens); generations also carry their metrics
+        output, tokens, *metrics = result.get()
+        if from_cache:
+            stats.record_cache_hit()
+            metrics = None
+        else:
+            stats.record(tokens)
+            metrics = metrics[0]
+            if cache is not None and in_flight.pop(key, None) is not None:
+                # A reply that is still not JSON gets another chance the next run
+                if not structured or parse_json_object(output) is not None:
+                    cache.put(key, output, tokens)
+        return (payload, output, metrics) if with_metrics else (payload, output)
+
+    try:
+        for payload, prompt in items:
+            key = cache.make_key(prompt, cache_model_name, max_tokens, generation_params) if cache is not None and prompt is not None else None
+            cached = cache.get(key) if key is not None else None
+            if prompt is None:
+                pending.append((payload, None, None, False))
+            elif cached is not None:
+                pending.append((payload, key, _Done(cached), True))
+            elif key in in_flight:
+                pending.append((payload, key, in_flight[key], True))
+            else:
+                if pool:
+                    result = pool.apply_async(_generate_task, (prompt, max_tokens, generation_params, structured))
+                else:
+                    result = _Done(_generate_timed(model, prompt, max_tokens, generation_params, structured))
+                if key is not None:
+                    in_flight[key] = result
+                pending.append((payload, key, result, False))
+
+            while len(pending) > window:
+                yield finish(pending.popleft())
+
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        if pool:
+            pool.terminate()
@@ -0,0 +1,121 @@
+import re
+
+# Two patterns per category: the first one wins when both match
+CATEGORIES = {
+    'job_title': [r'\b(job title|position|role)\b', r'\b(we are looking for|we are seeking|seeking|looking for)\b'],
+    'company': [r'\b(company|organization|employer)\b', r'\b(about us|who we are)\b'],
+    'location': [r'\b(location|city|state|place)\b', r'\b(where)\b'],
+    'salary': [r'\b(salary|pay|compensation|wage)\b', r'\b(\$\d+(\.\d+)?(\s+|-)\$\d+(\.\d+)?)\b'],
+    'job_type': [r'\b(job type|employment type)\b', r'\b(full[-\s]time|part[-\s]time|contract|temporary|permanent)\b'],
+    'benefits': [r'\b(benefits|perks)\b', r'\b(health insurance|dental insurance|401k|vacation|paid time off)\b'],
+    'required_skills': [r'\b(required skills|must have|requirements|qualifications)\b', r'\b(proficiency|experience|familiarity) with\b'],
+    'preferred_skills': [r'\b(preferred skills|nice to have|bonus|additional qualifications)\b', r'\b(knowledge of|experience with|familiarity with)\b'],
+    'education': [r'\b(education|degree|diploma)\b', r'\b(bachelor''s|master''s|phd|high school|college)\b'],
+    'experience': [r'\b(experience|years of experience)\b', r'\b(\d+(\+)?\s+years)\b']
+}
+
+def _first_chars(term):
+    """ First character (or escape) of each alternative in a \\b(alt|alt|...) pattern """
+    chars = []
+    body = term[3:]
+    depth = 0
+    at_start = True
+    i = 0
+    while i < len(body):
+        char = body[i]
+        token = body[i:i + 2] if char == '\\' else char
+        if at_start:
+            chars.append(token)
+            at_start = False
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == '|' and depth == 0:
+            at_start = True
+        i += len(token)
+    return chars
+
+
+# (category, priority) for every pattern, in the same order as CATEGORIES
+_PATTERN_KEYS = [(category, priority) for category, terms in CATEGORIES.items() for priority in range(len(terms))]
+_TERMS = [term for terms in CATEGORIES.values() for term in terms]
+# Patterns run on lower-cased text, which is much faster than re.IGNORECASE
+_PATTERNS = [re.compile(term) for term in _TERMS]
+# Matches wherever any pattern could start; the lookahead lets the regex engine skip
+# quickly over characters no pattern starts with before trying the alternation
+_ANY_PATTERN = re.compile('(?=[' + ''.join(sorted({char for term in _TERMS for char in _first_chars(term)})) + '])'
+                          + r'\b(?:' + '|'.join(term[2:] for term in _TERMS) + ')')
+
+
+def _patterns_by_first_char():
+    """ Which patterns can start with a given character, so a hit is only checked against those """
+    by_char = {}
+    for index, term in enumerate(_TERMS):
+        for token in _first_chars(term):
+            for char in ('0123456789' if token == '\\d' else token[-1]):
+                by_char.setdefault(char, []).append(index)
+    return by_char
+
+
+_PATTERNS_BY_FIRST_CHAR = _patterns_by_first_char()
+
+
+def _line_from(text, start):
+    end_index = text.find('\n', start)
+    if end_index == -1:
+        end_index = len(text)
+    return text[start:end_index].strip()
+
+
+def find_category_matches(text):
+    """ Leftmost match position of every category pattern, from a single scan of the text
+
+    The combined alternation finds each position where some pattern starts; only
+    those positions are then checked against the individual patterns that have
+    not matched yet, so the text is scanned once instead of once per pattern.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few non-ASCII characters change length when lower-cased; positions would not line up
+        return {key: match.start() for key, term in zip(_PATTERN_KEYS, _TERMS)
+                if (match := re.search(term, text, re.IGNORECASE))}
+    text = lowered
+
+    first_match = {}
+    remaining = set(range(len(_PATTERNS)))
+    position = 0
+    while remaining:
+        hit = _ANY_PATTERN.search(text, position)
+        if hit is None:
+            break
+        start = hit.start()
+        for index in _PATTERNS_BY_FIRST_CHAR[text[start]]:
+            if index in remaining and _PATTERNS[index].match(text, start):
+                first_match[_PATTERN_KEYS[index]] = start
+                remaining.discard(index)
+        position = start + 1
+    return first_match
+
+
+def classify_job_description(job_description):
+    first_match = find_category_matches(job_description)
+
+    classified_data = {}
+    unmatched = False
+    for category, regex_terms in CATEGORIES.items():
+        for priority in range(len(regex_terms)):
+            start = first_match.get((category, priority))
+            if start is not None:
+                classified_data[category] = _line_from(job_description, start)
+                break
+        else:
+            unmatched = True
+
+    # The full description is kept once for anything the categories did not pick up
+    if unmatched:
+        classified_data['raw'] = job_description
+
+    return classified_data
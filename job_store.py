@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+
+JSONL_FILE = 'job_posts.jsonl'
+JSON_FILE = 'job_posts.json'
+
+
+def default_input_file():
+    """ Prefer the JSONL file written by the scraper, falling back to the old job_posts.json """
+    return JSONL_FILE if os.path.exists(JSONL_FILE) else JSON_FILE
+
+
+def iter_job_posts(filename):
+    """ Yield (job_url, job_details) pairs one at a time
+
+    JSONL files hold one posting per line, {"Job URL": ..., <details>}, and are
+    read lazily so memory stays flat however large the crawl is. Plain .json
+    files in the old {url: details} layout are still accepted.
+    """
+    if not filename.endswith('.jsonl'):
+        with open(filename, 'r') as file:
+            yield from json.load(file).items()
+        return
+
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job_details = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated last line
+                continue
+            job_url = job_details.pop('Job URL')
+            yield job_url, job_details
+
+
+class JobPostWriter:
+    """ Append-only JSONL writer; every posting is flushed as soon as it is written """
+
+    def __init__(self, filename=JSONL_FILE, mode='a'):
+        self.file = open(filename, mode, encoding='utf-8')
+
+    def write(self, job_url, job_details):
+        self.file.write(json.dumps({'Job URL': job_url, **job_details}) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def convert_json_to_jsonl(json_filename=JSON_FILE, jsonl_filename=JSONL_FILE):
+    """ Rewrite an existing job_posts.json as JSONL """
+    writer = JobPostWriter(jsonl_filename, mode='w')
+    count = 0
+    for job_url, job_details in iter_job_posts(json_filename):
+        writer.write(job_url, job_details)
+        count += 1
+    writer.close()
+    print(f"Wrote {count} postings to {jsonl_filename}")
+
+
+if __name__ == "__main__":
+    # python job_store.py [job_posts.json] [job_posts.jsonl]
+    convert_json_to_jsonl(*sys.argv[1:3])
@@ -0,0 +1,288 @@
+""" Scrape, classify, de-duplicate, answer and write job postings as one streaming pipeline
+
+    python pipeline.py "software engineer" "data analyst" --location "Atlanta, GA" --num-results 100 --workers 2
+    python pipeline.py --input job_posts.jsonl --backend fake
+
+Every stage runs at the same time with its own number of workers, joined by
+bounded queues: when the model falls behind, the queues fill up and the
+crawler waits instead of piling postings up in memory. Results are written as
+soon as each posting is answered, and the depth and throughput of every stage
+is printed while it runs.
+"""
+import time
+import asyncio
+import argparse
+from job_classifier import classify_job_description
+from job_store import JobPostWriter, iter_job_posts
+from dedup import NearDuplicateIndex, normalize_job_url, add_dedup_arguments
+from prompt_compaction import PromptCompactor, add_compaction_arguments, prompt_token_budget_from_args
+from prefix_cache import PrefixCachedModel
+from backends import THREADED_BACKENDS, load_backend, backend_model_name
+from inference_pool import InferenceStats, default_threads_per_worker, generate_json, generation_metrics, add_inference_arguments, inference_options_from_args
+from run_journal import RunJournal, add_journal_arguments
+from structured_output import ParseStats, parse_json_object
+from telemetry import add_telemetry_arguments, telemetry_from_args
+from columnar_output import add_parquet_arguments, parquet_file_from_args
+from run_full_input_csv_output import MODEL_NAME, MAX_TOKENS, PROMPT_PREFIX, CSV_HEADER, build_prompt, build_row
+
+# Put on a stage's queue once per worker when everything upstream is finished
+_DONE = object()
+
+
+class Stage:
+    """ A bounded input queue, the workers that drain it, and their throughput counters """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue = asyncio.Queue(queue_size)
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.start_time = time.perf_counter()
+
+    def status(self):
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return f"{self.name} q={self.queue.qsize()} done={self.processed} ({self.processed / elapsed:.2f}/s)"
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        per_item = self.busy_seconds / self.processed if self.processed else 0.0
+        return (f"{self.name:<9} {self.processed} items, {self.processed / elapsed:.2f}/s, "
+                f"{per_item:.3f}s per item across {self.workers} workers")
+
+
+async def run_stage(stage, handle, next_stage=None):
+    """ Run stage.workers copies of handle over the stage's queue, passing results on to next_stage
+
+    handle returns the item for the next stage, or None to drop it. When every
+    worker has seen the end marker, next_stage gets one per worker of its own.
+    """
+    async def worker():
+        while True:
+            item = await stage.queue.get()
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            result = await handle(item)
+            stage.busy_seconds += time.perf_counter() - start
+            stage.processed += 1
+            if result is not None and next_stage is not None:
+                await next_stage.queue.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(stage.workers)))
+    if next_stage is not None:
+        for _ in range(next_stage.workers):
+            await next_stage.queue.put(_DONE)
+
+
+async def crawl(args, stage):
+    """ Feed raw page text from the scraper into stage, blocking the crawler threads while it is full """
+    from scrape_engine import ScrapeEngine
+    loop = asyncio.get_running_loop()
+
+    def on_posting(job_url, job_text):
+        asyncio.run_coroutine_threadsafe(stage.queue.put((job_url, job_text)), loop).result()
+
+    # Classification is its own stage, so the engine hands the page text on as it is
+    engine = ScrapeEngine(args.search_terms, args.location, args.num_results, lambda job_text: job_text, on_posting,
+                          num_drivers=args.browsers, fetch_mode=args.fetch_mode)
+    await asyncio.to_thread(engine.run)
+    for _ in range(stage.workers):
+        await stage.queue.put(_DONE)
+
+
+async def read_input(filename, stage):
+    """ Feed postings that were scraped earlier into stage """
+    for job_url, job_details in iter_job_posts(filename):
+        await stage.queue.put((job_url, job_details))
+    for _ in range(stage.workers):
+        await stage.queue.put(_DONE)
+
+
+class Pipeline:
+    def __init__(self, args):
+        self.args = args
+        self.inference_options = inference_options_from_args(args)
+        self.backend = self.inference_options['backend']
+        self.backend_options = self.inference_options['backend_options']
+        self.cache = self.inference_options['cache']
+        self.cache_model_name = backend_model_name(self.backend, MODEL_NAME, **self.backend_options)
+        self.journal = RunJournal('pipeline', args.journal)
+        if args.restart:
+            self.journal.reset()
+        self.done_keys = self.journal.done_keys()
+        self.index = NearDuplicateIndex(args.dedup_threshold) if not args.no_dedup else None
+        self.writer = None if args.input else JobPostWriter()
+        self.compactor = PromptCompactor(build_prompt, prompt_token_budget_from_args(args, MAX_TOKENS), fields=None)
+        self.stats = InferenceStats()
+        self.parse_stats = ParseStats()
+        self.telemetry = telemetry_from_args('pipeline', args)
+        self.parquet_file = parquet_file_from_args(args)
+        # Answers of representatives that are not journaled yet, awaited by their duplicates
+        self.answers = {}
+        self.models = None
+
+        queue_size = args.queue_size
+        self.classify_stage = Stage('classify', args.classify_workers, queue_size)
+        self.dedup_stage = Stage('dedup', 1, queue_size)
+        self.infer_stage = Stage('infer', max(args.workers, 1), queue_size)
+        self.sink_stage = Stage('sink', 1, queue_size)
+        self.stages = [self.classify_stage, self.dedup_stage, self.infer_stage, self.sink_stage]
+
+    async def classify(self, item):
+        job_url, job_details = item
+        if isinstance(job_details, str):
+            job_details = await asyncio.to_thread(classify_job_description, job_details)
+        return job_url, job_details
+
+    async def dedup(self, item):
+        job_url, job_details = item
+        if self.writer is not None:
+            await asyncio.to_thread(self.writer.write, job_url, job_details)
+        if normalize_job_url(job_url) in self.done_keys:
+            return None
+        representative = self.index.add(job_url, job_details) if self.index is not None else None
+        if representative is None:
+            self.answers[job_url] = asyncio.get_running_loop().create_future()
+            return job_url, job_details, None
+        return job_url, job_details, representative
+
+    async def infer(self, item):
+        job_url, job_details, representative = item
+        if representative is not None:
+            # The sink waits for the representative's answer
+            return job_url, representative, None, None
+        start = time.perf_counter()
+        metrics = None
+        # Compaction and the cache's SQLite reads and writes would block the event loop
+        prompt, key, cached = await asyncio.to_thread(self.prepare, job_url, job_details)
+        if cached is not None:
+            output = cached[0]
+            self.stats.record_cache_hit()
+        else:
+            model = await self.models.get()
+            timing = {}
+            try:
+                output, tokens = await asyncio.to_thread(generate_json, model, prompt, MAX_TOKENS, None, timing)
+            finally:
+                self.models.put_nowait(model)
+            metrics = generation_metrics(prompt, tokens, timing)
+            self.stats.record(tokens)
+            if key is not None and parse_json_object(output) is not None:
+                await asyncio.to_thread(self.cache.put, key, output, tokens)
+        self.answers[job_url].set_result(output)
+        return job_url, None, time.perf_counter() - start, metrics
+
+    def prepare(self, job_url, job_details):
+        """ The compacted prompt, its cache key and the cached (output, tokens), if any """
+        prompt = self.compactor.prompt(job_url, job_details)
+        if self.cache is None:
+            return prompt, None, None
+        key = self.cache.make_key(prompt, self.cache_model_name, MAX_TOKENS)
+        return prompt, key, self.cache.get(key)
+
+    async def sink(self, item):
+        job_url, representative, seconds, metrics = item
+        start = time.perf_counter()
+        output = await self.answer_of(representative or job_url)
+        row, valid = build_row(job_url, output)
+        if representative is None:
+            self.parse_stats.record(valid)
+            print(f"Generated Output for {job_url}: {output}")
+        # Each record is committed and synced to disk
+        await asyncio.to_thread(self.journal.record, job_url, 'duplicate' if representative else 'model', output, row,
+                                seconds if seconds is not None else time.perf_counter() - start)
+        if representative is None:
+            # Duplicates that come later read the answer back from the journal
+            del self.answers[job_url]
+        self.telemetry.record(job_url, 'duplicate' if representative else 'model' if metrics else 'cache', metrics)
+        return None
+
+    async def answer_of(self, job_url):
+        """ The output of a representative, waiting for it if the model has not answered yet """
+        future = self.answers.get(job_url)
+        if future is not None:
+            return await future
+        output, _ = await asyncio.to_thread(self.journal.lookup, job_url)
+        return output
+
+    async def load_models(self):
+        """ One model per inference worker, each reusing the instruction prefix """
+        self.models = asyncio.Queue()
+        n_threads = self.args.threads_per_worker
+        # The workers share this process, so a local model's threads are split between them
+        if self.backend not in THREADED_BACKENDS and self.infer_stage.workers > 1:
+            n_threads = n_threads or default_threads_per_worker(self.infer_stage.workers)
+        for _ in range(self.infer_stage.workers):
+            model = await asyncio.to_thread(load_backend, self.backend, MODEL_NAME, n_threads, **self.backend_options)
+            if self.inference_options['reuse_prefix']:
+                model = PrefixCachedModel(model, PROMPT_PREFIX)
+            self.models.put_nowait(model)
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(self.args.report_every)
+            print(' | '.join(stage.status() for stage in self.stages))
+
+    async def run(self):
+        await self.load_models()
+        if self.args.input:
+            source = read_input(self.args.input, self.classify_stage)
+        else:
+            source = crawl(self.args, self.classify_stage)
+        monitor = asyncio.create_task(self.monitor())
+        try:
+            await asyncio.gather(
+                source,
+                run_stage(self.classify_stage, self.classify, self.dedup_stage),
+                run_stage(self.dedup_stage, self.dedup, self.infer_stage),
+                run_stage(self.infer_stage, self.infer, self.sink_stage),
+                run_stage(self.sink_stage, self.sink),
+            )
+        finally:
+            monitor.cancel()
+            self.journal.export_csv('job_results.csv', CSV_HEADER)
+            if self.parquet_file:
+                self.journal.export_parquet(self.parquet_file, CSV_HEADER)
+            self.journal.close()
+            self.telemetry.close()
+            if self.writer is not None:
+                self.writer.close()
+
+        for stage in self.stages:
+            print(stage.summary())
+        self.compactor.report()
+        self.stats.report()
+        self.telemetry.report()
+        self.parse_stats.report()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('search_terms', nargs='*', help="search terms to crawl on Indeed")
+    parser.add_argument('--location', default='')
+    parser.add_argument('--num-results', type=int, default=100)
+    parser.add_argument('--browsers', type=int, default=4, help="parallel browser sessions for the crawl")
+    parser.add_argument('--fetch-mode', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--input', default=None, help="answer postings from this JSONL/JSON file instead of crawling")
+    parser.add_argument('--classify-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=16, help="postings each stage can hold before the one before it waits")
+    parser.add_argument('--report-every', type=float, default=10.0, help="seconds between stage status lines")
+    add_inference_arguments(parser)
+    add_dedup_arguments(parser)
+    add_compaction_arguments(parser)
+    add_journal_arguments(parser)
+    add_telemetry_arguments(parser)
+    add_parquet_arguments(parser)
+    args = parser.parse_args()
+    if not args.input and not args.search_terms:
+        parser.error("give search terms to crawl or --input")
+    return args
+
+
+def main():
+    asyncio.run(Pipeline(parse_args()).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import queue
+import inspect
+import threading
+from prompt_compaction import fits_context
+
+# Settings GPT4All.generate() passes to prompt_model(), which has defaults of its own
+SAMPLING_PARAMS = ('temp', 'top_k', 'top_p', 'min_p', 'repeat_penalty', 'repeat_last_n', 'n_batch')
+
+
+class PrefixCachedModel:
+    """ Wraps a GPT4All model so a fixed prompt prefix is evaluated only once
+
+    The prefix is fed through the model the first time it is needed and the
+    number of tokens it filled in the KV cache is remembered. Every prompt that
+    starts with the prefix then rewinds the context to that point and only
+    evaluates the rest, so the instruction block costs nothing after the first
+    posting. Prompts without the prefix, prompts that might not fit the
+    context with their answer, or bindings that do not expose the prompt
+    context, fall back to a normal generate() call.
+
+    When the context overflows, the backend drops its oldest tokens and
+    shifts the rest, so the saved prefix is no longer at the start of the KV
+    cache. The context is checked after every generation and the prefix is
+    evaluated again when that happened.
+
+    prompt_model() samples with different defaults than generate(), so the
+    suffix is generated with generate()'s defaults under the caller's settings,
+    and reusing the prefix does not change the answers or their cache keys.
+    """
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+        self.prefix_tokens = None
+        self.prefix_token_ids = None
+        llmodel = getattr(model, 'model', None)
+        self.llmodel = llmodel if hasattr(llmodel, 'prompt_model') and hasattr(llmodel, 'context') else None
+        # Older bindings take a prompt template; '%1' sends the text as it is, like generate() outside a chat session
+        self.template_args = ()
+        if self.llmodel is not None and 'prompt_template' in inspect.signature(self.llmodel.prompt_model).parameters:
+            self.template_args = ('%1',)
+        self.sampling_defaults = {}
+        if self.llmodel is not None:
+            generate_params = inspect.signature(model.generate).parameters
+            prompt_params = inspect.signature(self.llmodel.prompt_model).parameters
+            self.sampling_defaults = {name: generate_params[name].default for name in SAMPLING_PARAMS
+                                      if name in generate_params and name in prompt_params
+                                      and generate_params[name].default is not inspect.Parameter.empty}
+
+    def _evaluate_prefix(self):
+        self.llmodel.prompt_model(self.prefix, *self.template_args, lambda token_id, response: True, n_predict=0, reset_context=True)
+        self.prefix_tokens = self.llmodel.context.n_past
+        self.prefix_token_ids = self._context_tokens(self.prefix_tokens)
+
+    def _context_tokens(self, count):
+        """ The first count token ids in the KV cache, or None if the bindings do not expose them """
+        context = self.llmodel.context
+        if not getattr(context, 'tokens', None) or context.tokens_size < count:
+            return None
+        return tuple(context.tokens[:count])
+
+    def _prefix_intact(self):
+        """ Whether the KV cache still starts with the prefix, i.e. the context was not shifted """
+        context = self.llmodel.context
+        if context.n_past < self.prefix_tokens:
+            return False
+        if self.prefix_token_ids is None:
+            return True
+        return self._context_tokens(self.prefix_tokens) == self.prefix_token_ids
+
+    def _n_ctx(self):
+        return getattr(self.llmodel, 'n_ctx', None) or getattr(self.llmodel.context, 'n_ctx', None)
+
+    def generate(self, prompt, max_tokens=200, streaming=False, **generation_params):
+        n_ctx = self._n_ctx() if self.llmodel is not None else None
+        if self.llmodel is None or not prompt.startswith(self.prefix) or (n_ctx and not fits_context(prompt, max_tokens, n_ctx)):
+            # generate() starts from an empty context, which throws the saved prefix away
+            self.prefix_tokens = None
+            return self.model.generate(prompt, max_tokens=max_tokens, streaming=streaming, **generation_params)
+        if self.prefix_tokens is None:
+            self._evaluate_prefix()
+        callback = generation_params.pop('callback', None)
+        pieces = self._generate_suffix(prompt[len(self.prefix):], max_tokens, callback, {**self.sampling_defaults, **generation_params})
+        return pieces if streaming else ''.join(pieces)
+
+    def _generate_suffix(self, suffix, max_tokens, callback, generation_params):
+        # Everything past the prefix is overwritten by the next prompt
+        self.llmodel.context.n_past = self.prefix_tokens
+        tokens = queue.Queue()
+
+        def on_token(token_id, response):
+            tokens.put(response)
+            return callback(token_id, response) if callback is not None else True
+
+        def run():
+            try:
+                self.llmodel.prompt_model(suffix, *self.template_args, on_token, n_predict=max_tokens, reset_context=False, **generation_params)
+            finally:
+                tokens.put(None)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while True:
+            token = tokens.get()
+            if token is None:
+                break
+            yield token
+        thread.join()
+        if not self._prefix_intact():
+            self.prefix_tokens = None
@@ -0,0 +1,166 @@
+import re
+import threading
+
+# Fields shorter than this are left alone when every field is compacted
+MIN_COMPACT_TOKENS = 50
+
+# Paragraphs that mention these are almost never needed to answer the questions
+BOILERPLATE_PATTERNS = [
+    # Equal opportunity / legal statements
+    r'equal (employment )?opportunity', r'without regard to', r'regardless of (race|age|gender)',
+    r'sexual orientation', r'gender identity', r'national origin', r'protected veteran', r'veteran status',
+    r'reasonable accommodations?', r'e-verify', r'affirmative action', r'pay transparency', r'fair chance',
+    r'background check', r'drug[- ]free', r'at-will',
+    # Benefits lists
+    r'401\(?k\)?', r'dental', r'vision insurance', r'health insurance', r'paid time off', r'\bpto\b',
+    r'life insurance', r'tuition', r'parental leave', r'employee assistance', r'wellness', r'benefits? (include|package)',
+    # Company mission / culture blurbs
+    r'our mission', r'our vision', r'our values', r'our culture', r'we believe', r'founded in',
+    r'is a leading', r'fortune \d+', r'best places to work', r'join (our|a) (diverse|talented|growing)',
+    r'life-changing', r'world-class',
+]
+_BOILERPLATE = re.compile('|'.join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+
+# Words that make a sentence useful for one of the six questions
+RELEVANCE_PATTERNS = [
+    r'experience', r'\d+\+?\s*(years|yrs)', r'\byears?\b', r'senior', r'junior', r'entry[- ]level',
+    r'qualifications?', r'required', r'requirements?', r'preferred', r'must', r'nice to have', r'plus\b',
+    r'degree', r'bachelor', r'master', r'certification', r'\bskills?\b',
+    r'clearance', r'secret', r'citizen', r'citizenship', r'u\.?s\.? person', r'sponsorship', r'polygraph',
+    r'remote', r'hybrid', r'on[- ]?site', r'in[- ]office', r'telework', r'relocat',
+    r'contract', r'full[- ]time', r'part[- ]time', r'temp', r'to[- ]hire', r'w2', r'c2c', r'permanent',
+    r'languages?', r'programming', r'python', r'\bjava\b', r'javascript', r'typescript', r'\bc\+\+', r'\bc#',
+    r'\.net', r'\bsql\b', r'\bgo\b', r'golang', r'ruby', r'\brust\b', r'kotlin', r'swift', r'scala', r'\bphp\b',
+    r'\bperl\b', r'matlab', r'\bbash\b', r'powershell', r'\bhtml\b', r'\bcss\b', r'react', r'angular', r'node',
+]
+_RELEVANCE = re.compile('|'.join(RELEVANCE_PATTERNS), re.IGNORECASE)
+
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+# estimate_tokens counts words and punctuation marks; BPE tokenizers split long and rare words further
+BPE_TOKENS_PER_ESTIMATE = 1.3
+
+
+def estimate_tokens(text):
+    """ Rough token count: words and punctuation marks, which tracks BPE tokenizers closely enough for budgeting """
+    return len(_TOKEN.findall(text))
+
+
+def context_token_budget(n_ctx, max_tokens):
+    """ Largest estimated prompt that still leaves room for max_tokens of answer in an n_ctx context """
+    return max(int((n_ctx - max_tokens) / BPE_TOKENS_PER_ESTIMATE), MIN_COMPACT_TOKENS)
+
+
+def fits_context(prompt, max_tokens, n_ctx):
+    """ Whether the prompt and its answer fit the context, allowing for estimate_tokens counting low """
+    return estimate_tokens(prompt) * BPE_TOKENS_PER_ESTIMATE + max_tokens <= n_ctx
+
+
+def _is_boilerplate(sentence):
+    hits = len(_BOILERPLATE.findall(sentence))
+    return hits >= 2 or (hits == 1 and not _RELEVANCE.search(sentence))
+
+
+def compact_text(text, token_budget):
+    """ Shrink a job description to about token_budget tokens
+
+    Boilerplate sentences and repeated paragraphs are always dropped. If the
+    rest is still over budget, sentences are ranked by how many question
+    keywords they mention and the best ones are kept, in their original order.
+    """
+    seen_paragraphs = set()
+    sentences = []
+    for paragraph in text.split('\n'):
+        key = ' '.join(paragraph.lower().split())
+        if not key or key in seen_paragraphs:
+            continue
+        seen_paragraphs.add(key)
+        for sentence in _SENTENCE_END.split(paragraph.strip()):
+            if sentence and not _is_boilerplate(sentence):
+                sentences.append(sentence)
+        sentences.append('\n')
+
+    sizes = [estimate_tokens(sentence) for sentence in sentences]
+    if sum(sizes) > token_budget:
+        ranked = sorted((i for i, sentence in enumerate(sentences) if sentence != '\n'),
+                        key=lambda i: (-len(_RELEVANCE.findall(sentences[i])), i))
+        keep = set()
+        used = 0
+        for i in ranked:
+            if used + sizes[i] <= token_budget:
+                keep.add(i)
+                used += sizes[i]
+        sentences = [sentence for i, sentence in enumerate(sentences) if i in keep or sentence == '\n']
+
+    compacted = ' '.join(sentences)
+    return '\n'.join(' '.join(line.split()) for line in compacted.split('\n') if line.strip())
+
+
+class PromptCompactor:
+    """ Renders prompts so they fit a token budget, compacting the long free-text fields first
+
+    fields names the job_details fields the prompt template shows; None means
+    the whole dict goes into the prompt, so every long text field is compacted.
+    """
+
+    def __init__(self, build_prompt, token_budget, fields=('Job Description',)):
+        self.build_prompt = build_prompt
+        self.token_budget = token_budget
+        self.fields = fields
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.postings = 0
+        self.lock = threading.Lock()
+
+    def prompt(self, job_url, job_details, *prompt_args):
+        """ Render build_prompt(job_details, *prompt_args), compacted to the token budget """
+        prompt = self.build_prompt(job_details, *prompt_args)
+        before = after = estimate_tokens(prompt)
+        if self.token_budget:
+            prompt, after = self._compact(job_details, before, prompt_args)
+            print(f"Prompt tokens for {job_url}: {before} -> {after}")
+        with self.lock:
+            self.postings += 1
+            self.tokens_before += before
+            self.tokens_after += after
+        return prompt
+
+    def _compact(self, job_details, prompt_tokens, prompt_args):
+        if self.fields is None:
+            field_tokens = {field: estimate_tokens(value) for field, value in job_details.items() if isinstance(value, str)}
+            field_tokens = {field: tokens for field, tokens in field_tokens.items() if tokens >= MIN_COMPACT_TOKENS}
+        else:
+            field_tokens = {field: estimate_tokens(str(job_details[field])) for field in self.fields if job_details.get(field)}
+        overhead = prompt_tokens - sum(field_tokens.values())
+        available = max(self.token_budget - overhead, 0)
+        # Retry with a tighter budget if the template renders the fields longer than estimated
+        for _ in range(3):
+            compacted = dict(job_details)
+            total = sum(field_tokens.values()) or 1
+            for field, tokens in field_tokens.items():
+                compacted[field] = compact_text(str(job_details[field]), available * tokens // total)
+            prompt = self.build_prompt(compacted, *prompt_args)
+            tokens = estimate_tokens(prompt)
+            if tokens <= self.token_budget or available == 0:
+                break
+            available = max(available - (tokens - self.token_budget), 0)
+        return prompt, tokens
+
+    def report(self):
+        if self.postings and self.token_budget:
+            print(f"Prompt tokens: {self.tokens_before} -> {self.tokens_after} "
+                  f"({self.tokens_before / self.postings:.0f} -> {self.tokens_after / self.postings:.0f} per posting)")
+
+
+def add_compaction_arguments(parser):
+    parser.add_argument('--prompt-token-budget', type=int, default=None,
+                        help="compact long job descriptions so each prompt fits about this many tokens "
+                             "(default: what fits in --n-ctx next to the answer, 0 to send them whole)")
+
+
+def prompt_token_budget_from_args(args, max_tokens):
+    if args.prompt_token_budget is not None:
+        return args.prompt_token_budget
+    return context_token_budget(args.n_ctx, max_tokens)
@@ -0,0 +1,76 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """ Persistent SQLite cache of model responses with size-based LRU eviction
+
+    Entries are keyed on a hash of everything that changes the generated text:
+    the rendered prompt, the model file name, max_tokens and the sampling settings.
+    get() and put() can be called from any thread.
+    """
+
+    def __init__(self, filename='llm_cache.sqlite', max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                 key TEXT PRIMARY KEY,
+                                 output TEXT NOT NULL,
+                                 tokens INTEGER NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 last_access REAL NOT NULL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, model_name, max_tokens, generation_params=None):
+        payload = json.dumps({
+            'prompt': prompt,
+            'model': model_name,
+            'max_tokens': max_tokens,
+            'params': generation_params or {},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """ Return (output, tokens) for a cached response, or None on a miss """
+        with self.lock:
+            row = self.conn.execute('SELECT output, tokens FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+        return row[0], row[1]
+
+    def put(self, key, output, tokens):
+        size = len(key) + len(output.encode('utf-8'))
+        with self.lock:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if old:
+                self.total_bytes -= old[0]
+            self.conn.execute('INSERT OR REPLACE INTO responses (key, output, tokens, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                              (key, output, tokens, size, time.time()))
+            self.total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """ Drop the least recently used entries until the cache fits in max_bytes """
+        if self.total_bytes <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY last_access'):
+            if self.total_bytes <= self.max_bytes:
+                break
+            victims.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', victims)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,205 @@
+import re
+from dedup import posting_text
+
+# The six questions of run.py / run_csv_output.py, in prompt order
+QUESTION_FIELDS = ['Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages']
+
+# Language names, with the spelling used in the answer
+PROGRAMMING_LANGUAGES = {
+    'python': 'Python', 'java': 'Java', 'javascript': 'JavaScript', 'typescript': 'TypeScript', 'c++': 'C++',
+    'c#': 'C#', '.net': '.NET', 'sql': 'SQL', 'golang': 'Go', 'ruby': 'Ruby', 'rust': 'Rust', 'kotlin': 'Kotlin',
+    'swift': 'Swift', 'scala': 'Scala', 'php': 'PHP', 'perl': 'Perl', 'matlab': 'MATLAB', 'bash': 'Bash',
+    'powershell': 'PowerShell', 'html': 'HTML', 'css': 'CSS', 'objective-c': 'Objective-C', 'r': 'R',
+    'vba': 'VBA', 'cobol': 'COBOL', 'fortran': 'Fortran', 'groovy': 'Groovy', 'dart': 'Dart', 'lua': 'Lua',
+    'haskell': 'Haskell', 'elixir': 'Elixir', 'clojure': 'Clojure', 'solidity': 'Solidity', 'abap': 'ABAP',
+    'apex': 'Apex', 'verilog': 'Verilog', 'vhdl': 'VHDL', 'shell scripting': 'Shell',
+}
+# Names that are also ordinary words only count when capitalised like the language
+_CASE_SENSITIVE = {'Swift', 'Rust', 'Dart', 'Apex', 'Ruby', 'Groovy', 'Elixir'}
+# "R" and "Go" are ordinary words too, so they only count next to a comma, slash or "and"
+_LANGUAGE = re.compile(r'(?<![\w+#.-])(' + '|'.join(re.escape(name) for name in sorted(PROGRAMMING_LANGUAGES, key=len, reverse=True)
+                                                 if name != 'r') + r')(?![\w+#-])', re.IGNORECASE)
+_R_LANGUAGE = re.compile(r'(?:[,/]\s*|\band\s+)R\b(?!&)|\bR(?=\s*[,/])')
+_GO_LANGUAGE = re.compile(r'(?:[,/]\s*|\band\s+)Go\b|\bGo(?=\s*[,/(])')
+_PROGRAMMING_CONTEXT = re.compile(r'programming|software|developer|engineer|coding|scripting|languages?|stack|web|data|devops|it\b', re.IGNORECASE)
+
+# "3+ years of experience", "2-4 years experience", "experience of 6 to 8 years"; the upper bound is optional
+_YEARS = re.compile(r'(\d{1,2})\s*\+?\s*(?:(?:-|to)\s*(\d{1,2})\s*\+?\s*)?(?:years?|yrs)\b[^.\n]{0,60}?experience'
+                    r'|experience[^.\n]{0,30}?(?:of\s+)?(\d{1,2})\s*\+?\s*(?:(?:-|to)\s*(\d{1,2})\s*\+?\s*)?(?:years?|yrs)\b',
+                    re.IGNORECASE)
+_NO_EXPERIENCE = re.compile(r'no (?:prior |previous )?experience (?:is )?(?:required|necessary|needed)', re.IGNORECASE)
+
+_CLEARANCE = re.compile(r'\b(ts/sci|top secret|secret clearance|public trust|security clearance|clearance required'
+                        r'|active clearance|dod clearance|polygraph)', re.IGNORECASE)
+_NO_CLEARANCE = re.compile(r"\b(?:does not|doesn't|do not|don't|will not) require (?:an? |any )?(?:security )?clearance"
+                           r'|\bno (?:security )?clearance (?:is )?(?:required|needed|necessary)', re.IGNORECASE)
+_CITIZENSHIP = re.compile(r'\b(u\.?s\.? citizen(?:s|ship)?|united states citizen(?:s|ship)?|us persons?)\b', re.IGNORECASE)
+
+_WORK_LOCATIONS = [
+    ('Hybrid', re.compile(r'\bhybrid\b', re.IGNORECASE)),
+    ('Remote', re.compile(r'\b(?:fully |100% )?remote\b|\bwork from home\b|\btelework', re.IGNORECASE)),
+    ('On-site', re.compile(r'\bon[- ]?site\b|\bin[- ]office\b|\bin person\b', re.IGNORECASE)),
+]
+
+_POSITION_TYPES = [
+    ('Temp-to-Hire', re.compile(r'\btemp(?:orary)?[- ]to[- ](?:hire|perm)|\bcontract[- ]to[- ]hire', re.IGNORECASE)),
+    ('Contract', re.compile(r'\bcontract(?:or)?\b', re.IGNORECASE)),
+    ('Full-Time', re.compile(r'\bfull[- ]time\b|\bpermanent\b', re.IGNORECASE)),
+    ('Part-Time', re.compile(r'\bpart[- ]time\b', re.IGNORECASE)),
+    ('Temporary', re.compile(r'\btemporary\b|\bseasonal\b', re.IGNORECASE)),
+    ('Internship', re.compile(r'\bintern(?:ship)?\b', re.IGNORECASE)),
+]
+
+
+def answer_experience(text):
+    if _NO_EXPERIENCE.search(text):
+        return 'No', 0.9
+    years = []
+    for match in _YEARS.finditer(text):
+        low, high = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        value = (int(low), int(high) if high else None)
+        if value not in years:
+            years.append(value)
+    if not years:
+        return None
+    # A single figure is almost always the requirement; several usually mean per-skill years
+    confidence = 0.9 if len(years) == 1 else 0.6
+    low, high = years[0]
+    if low == 0:
+        # "0-2 years" is open to people without experience
+        return 'No', min(confidence, 0.85)
+    return (f"Yes, {low}-{high} years" if high else f"Yes, {low}+ years"), confidence
+
+
+def answer_security_clearance(text):
+    # "does not require security clearance" names a clearance too
+    stated_none = _NO_CLEARANCE.search(text)
+    clearances = {match.group(1).lower() for match in _CLEARANCE.finditer(_NO_CLEARANCE.sub(' ', text))}
+    citizenship = _CITIZENSHIP.search(text)
+    if clearances:
+        details = ', '.join(sorted(clearances)) + (', US citizenship' if citizenship else '')
+        return f"Yes, {details}", 0.9
+    if citizenship:
+        return 'Yes, US citizenship', 0.85
+    if stated_none:
+        return 'No', 0.9
+    # Finding none of the keywords is weak evidence; the model reads the posting
+    return 'No', 0.5
+
+
+def answer_job_location(text, location):
+    for label, pattern in _WORK_LOCATIONS:
+        if pattern.search(location):
+            # Indeed puts "Remote" or "Hybrid remote in ..." in the location line itself
+            return label, 0.95
+    found = [label for label, pattern in _WORK_LOCATIONS if pattern.search(text)]
+    if len(found) == 1:
+        return found[0], 0.85
+    if 'Hybrid' in found:
+        return 'Hybrid', 0.7
+    return None
+
+
+def answer_position_type(text, job_type):
+    if job_type:
+        found = [label for label, pattern in _POSITION_TYPES if pattern.search(job_type)]
+        if found:
+            return ', '.join(found), 0.95
+    found = [label for label, pattern in _POSITION_TYPES if pattern.search(text)]
+    if 'Temp-to-Hire' in found:
+        return 'Temp-to-Hire', 0.85
+    if len(found) == 1:
+        return found[0], 0.85
+    return None
+
+
+def answer_programming_languages(text, job_title):
+    found = []
+    for match in _LANGUAGE.finditer(text):
+        name = PROGRAMMING_LANGUAGES[match.group(1).lower()]
+        if name in _CASE_SENSITIVE and match.group(1) != name:
+            continue
+        if name not in found:
+            found.append(name)
+    if _GO_LANGUAGE.search(text) and 'Go' not in found:
+        found.append('Go')
+    if _R_LANGUAGE.search(text) and found:
+        found.append('R')
+    if found:
+        return ', '.join(found), 0.85
+    if not _PROGRAMMING_CONTEXT.search(text) and not _PROGRAMMING_CONTEXT.search(job_title):
+        # Nothing about software in the posting at all
+        return 'None', 0.85
+    return None
+
+
+def answer_with_rules(job_details):
+    """ Answer what the text settles on its own; returns {field: (answer, confidence)}
+
+    Qualifications needs judgement and is always left to the model.
+    """
+    text = posting_text(job_details)
+    answers = {
+        'Experience Required': answer_experience(text),
+        'Security Clearance': answer_security_clearance(text),
+        'Job Location': answer_job_location(text, str(job_details.get('Location', ''))),
+        'Position Type': answer_position_type(text, str(job_details.get('Job Type', ''))),
+        'Programming Languages': answer_programming_languages(text, str(job_details.get('Job Title', ''))),
+    }
+    return {field: answer for field, answer in answers.items() if answer is not None}
+
+
+class RuleEngine:
+    """ Splits each posting's questions between the rules and the model
+
+    Answers at or above min_confidence are used as they are; the rest of the
+    questions are sent to the model. Tracks how many answers each side gave.
+    """
+
+    def __init__(self, min_confidence=0.8, fields=QUESTION_FIELDS):
+        self.min_confidence = min_confidence
+        self.fields = fields
+        self.rule_answered = 0
+        self.model_answered = 0
+        self.skipped_postings = 0
+
+    def resolve(self, job_details):
+        """ Return ({field: (answer, confidence)} answered by rules, [fields left for the model]) """
+        if self.min_confidence is None:
+            return {}, list(self.fields)
+        answers = {field: answer for field, answer in answer_with_rules(job_details).items()
+                   if field in self.fields and answer[1] >= self.min_confidence}
+        return answers, [field for field in self.fields if field not in answers]
+
+    def record(self, resolved, unresolved):
+        self.rule_answered += len(resolved)
+        self.model_answered += len(unresolved)
+        if not unresolved:
+            self.skipped_postings += 1
+
+    def report(self, stats):
+        """ Print the rule/model split and the generation time the rules saved, estimated from this run's tokens/sec """
+        total = self.rule_answered + self.model_answered
+        if not self.rule_answered:
+            return
+        print(f"Rules answered {self.rule_answered} of {total} questions ({self.rule_answered / total:.0%}); "
+              f"{self.skipped_postings} postings skipped the model entirely")
+        if self.model_answered and stats.tokens:
+            tokens_per_answer = stats.tokens / self.model_answered
+            elapsed = max(stats.elapsed(), 1e-9)
+            saved = self.rule_answered * tokens_per_answer / (stats.tokens / elapsed)
+            print(f"Estimated inference time saved: {saved:.1f}s "
+                  f"({self.rule_answered} answers x {tokens_per_answer:.0f} tokens at {stats.tokens / elapsed:.1f} tokens/sec)")
+
+
+def answer_sources(resolved, unresolved):
+    """ One cell saying where each answer came from, e.g. "Job Location: rules (0.95); Qualifications: model" """
+    sources = {field: f"{field}: rules ({confidence:.2f})" for field, (_, confidence) in resolved.items()}
+    sources.update({field: f"{field}: model" for field in unresolved})
+    return '; '.join(sources[field] for field in QUESTION_FIELDS if field in sources)
+
+
+def add_rule_arguments(parser):
+    parser.add_argument('--rule-confidence', type=float, default=0.8,
+                        help="answer a question from the text without the model when the rules are at least this confident")
+    parser.add_argument('--no-rules', action='store_true', help="send every question to the model")
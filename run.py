@@ -1,64 +1,155 @@
-import json
-from gpt4all import GPT4All
+import time
+import argparse
 from tqdm import tqdm
+from inference_pool import InferenceStats, generate_outputs, add_inference_arguments, inference_options_from_args
+from backends import load_backend
+from dedup import mark_duplicates, add_dedup_arguments
+from job_store import iter_job_posts, default_input_file
+from prompt_compaction import PromptCompactor, add_compaction_arguments, prompt_token_budget_from_args
+from rule_answers import RuleEngine, QUESTION_FIELDS, add_rule_arguments
+from run_journal import RunJournal, add_journal_arguments
+from telemetry import Telemetry, add_telemetry_arguments, telemetry_from_args
+
+MODEL_NAME = "Meta-Llama-3-8B-Instruct.Q4_0.gguf"
+# Longest answer generated per posting
+MAX_TOKENS = 350
 
 def load_data(filename):
-    """ Load the JSON file containing job postings """
-    with open(filename, 'r') as file:
-        return json.load(file)
+    """ Lazily load the job postings from the scraper's JSONL file (or an older JSON file) """
+    return iter_job_posts(filename)
 
-def initialize_model():
-    """ Initialize the GPT4All model """
-    return GPT4All("Meta-Llama-3-8B-Instruct.Q4_0.gguf")
+def initialize_model(n_threads=None, backend='gpt4all', backend_options=None):
+    """ Initialize the model (GPT4All unless another backend is picked) """
+    return load_backend(backend, MODEL_NAME, n_threads, **(backend_options or {}))
     #or Meta-Llama-3-8B-Instruct.Q4_0.gguf for llama 3 8B
     #orca-mini-3b-gguf2-q4_0.gguf
 
 
-def process_jobs(job_posts, model):
-    """ Process each job posting to generate the formatted response and print only the generated output """
-    for job_url, job_details in tqdm(job_posts.items(), desc="Processing Jobs"):
-        # Create the prompt from job details
-        prompt = f"""
-        Analyze the job details provided and generate a structured response to the following questions:
+QUESTIONS = {
+    'Experience Required': ("Does the job require experience? If yes, how many years?", "[Yes/No, if yes, years required]"),
+    'Qualifications': ("Which qualifications are preferred and which are required?", "[Preferred/Required: details]"),
+    'Security Clearance': ("Does it require security clearance or US citizenship?", "[Yes/No, if yes, specifics]"),
+    'Job Location': ("Is the position on-site, hybrid, or remote?", "[On-site/Hybrid/Remote]"),
+    'Position Type': ("What is the position type? (contract, temp-to-hire, full-time, part-time, etc.)", "[Contract/Temp-to-Hire/Full-Time/Part-Time]"),
+    'Programming Languages': ("What programming languages should the candidate know?", "[Languages required]"),
+}
+
+# Instructions shared by every posting; they come first so the model only evaluates them once
+PROMPT_PREFIX = """
+        Analyze the job details that follow and generate a structured response to these questions:
+        """ + '\n        '.join(f"{number}. {question}" for number, (question, _) in enumerate(QUESTIONS.values(), 1)) + """
+
+        Please respond in the format:
+        """ + '\n        '.join(f"- {field}: {answer_format}" for field, (_, answer_format) in QUESTIONS.items()) + """
+"""
+
+def build_prompt(job_details, fields=QUESTION_FIELDS):
+    """ Create the prompt from job details, asking only the questions in fields """
+    only = ''
+    if list(fields) != QUESTION_FIELDS:
+        only = "Only respond with these lines:\n        " + '\n        '.join(f"- {field}: {QUESTIONS[field][1]}" for field in fields)
+    return PROMPT_PREFIX + f"""
+        Job details:
         - Job Title: {job_details.get('Job Title', 'No entry found for Job Title')}
         - Company Name: {job_details.get('Company Name', 'No entry found for Company Name')}
         - Location: {job_details.get('Location', 'No entry found for Location')}
         - Salary: {job_details.get('Salary', 'No entry found for Salary')}
         - Job Type: {job_details.get('Job Type', 'No entry found for Job Type')}
         - Job Description: {job_details.get('Job Description', 'No entry found for Job Description')}
-        
-        Questions:
-        1. Does the job require experience? If yes, how many years?
-        2. Which qualifications are preferred and which are required?
-        3. Does it require security clearance or US citizenship?
-        4. Is the position on-site, hybrid, or remote?
-        5. What is the position type? (contract, temp-to-hire, full-time, part-time, etc.)
-        6. What programming languages should the candidate know?
 
-        Please respond in the format:
-        - Experience Required: [Yes/No, if yes, years required]
-        - Qualifications: [Preferred/Required: details]
-        - Security Clearance: [Yes/No, if yes, specifics]
-        - Job Location: [On-site/Hybrid/Remote]
-        - Position Type: [Contract/Temp-to-Hire/Full-Time/Part-Time]
-        - Programming Languages: [Languages required]
+        {only}
         """
 
-        # Generate output from the model
-        generated_output = model.generate(prompt, max_tokens=350)
+def process_jobs(job_posts, model, journal, prompt_token_budget=0, rule_confidence=0.8, telemetry=None, **inference_options):
+    """ Process each job posting to generate the formatted response and print only the generated output """
+    stats = InferenceStats()
+    # Tokens, latency and memory of every posting, written next to the results
+    telemetry = telemetry or Telemetry('run', None)
+    # Long descriptions are trimmed to the token budget before they reach the model
+    compactor = PromptCompactor(build_prompt, prompt_token_budget)
+    # Questions the text answers on its own skip the model
+    rules = RuleEngine(rule_confidence)
+    items = (prompt_item(job_url, job_details, representative, rules, compactor)
+             for job_url, job_details, representative in job_posts)
+    outputs = generate_outputs(items, MAX_TOKENS, stats, model=model, model_name=MODEL_NAME, prompt_prefix=PROMPT_PREFIX, with_metrics=True,
+                               **inference_options)
+
+    try:
+        last_finished = time.perf_counter()
+        for (job_url, representative, resolved), generated_output, metrics in tqdm(outputs, desc="Processing Jobs"):
+            if representative:
+                # Duplicates skip the model and reuse the answer journaled for their representative
+                status = 'duplicate'
+                generated_output, _ = journal.lookup(representative)
+                print(f"Generated Output for {job_url} (same posting as {representative}): {generated_output}")
+            else:
+                status = 'model' if generated_output is not None else 'rules'
+                # Answers from the rules come first, marked with their confidence
+                rule_output = '\n'.join(f"- {field}: {answer} (rules, {confidence:.2f})" for field, (answer, confidence) in resolved.items())
+                generated_output = '\n'.join(part for part in (rule_output, generated_output) if part)
+
+                # Print the generated output
+                print(f"Generated Output for {job_url}: {generated_output}")
+
+            # Committed before the next posting, so a crash never loses a finished one
+            now = time.perf_counter()
+            journal.record(job_url, status, generated_output, seconds=now - last_finished)
+            telemetry.record(job_url, 'cache' if status == 'model' and metrics is None else status, metrics)
+            last_finished = now
+    finally:
+        # The answers of every posting finished so far, keyed by job URL
+        journal.export_json('job_results.json')
+
+    compactor.report()
+    stats.report()
+    telemetry.report()
+    rules.report(stats)
 
-        # Print the generated output
-        print(f"Generated Output for {job_url}: {generated_output}")
+def prompt_item(job_url, job_details, representative, rules, compactor):
+    """ Split the questions between the rules and the model; the prompt is None when the model is not needed """
+    if representative:
+        return (job_url, representative, {}), None
+    resolved, unresolved = rules.resolve(job_details)
+    rules.record(resolved, unresolved)
+    prompt = compactor.prompt(job_url, job_details, unresolved) if unresolved else None
+    return (job_url, representative, resolved), prompt
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Answer the job questions for every scraped posting")
+    parser.add_argument('--input', default=None, help="job postings file (default: job_posts.jsonl, or job_posts.json if there is none)")
+    add_inference_arguments(parser)
+    add_dedup_arguments(parser)
+    add_compaction_arguments(parser)
+    add_rule_arguments(parser)
+    add_journal_arguments(parser)
+    add_telemetry_arguments(parser)
+    return parser.parse_args()
 
 def main():
-    # Load job postings from a JSON file
-    job_posts = load_data('job_posts.json')
+    args = parse_args()
+
+    # Stream job postings from the JSONL file
+    job_posts = load_data(args.input or default_input_file())
+
+    # Pick up where an interrupted run stopped; --restart throws its results away
+    journal = RunJournal('run', args.journal)
+    if args.restart:
+        journal.reset()
+    job_posts = journal.skip_finished(job_posts)
+
+    # Only one posting per group of near-identical descriptions goes through the model
+    job_posts = mark_duplicates(job_posts, None if args.no_dedup else args.dedup_threshold)
 
-    # Initialize the GPT4All model
-    model = initialize_model()
+    # Initialize the model (pool workers load their own copies)
+    inference_options = inference_options_from_args(args)
+    model = initialize_model(args.threads_per_worker, args.backend, inference_options['backend_options']) if args.workers <= 1 else None
 
     # Process each job posting and print generated answers
-    process_jobs(job_posts, model)
+    rule_confidence = None if args.no_rules else args.rule_confidence
+    telemetry = telemetry_from_args('run', args)
+    process_jobs(job_posts, model, journal, prompt_token_budget_from_args(args, MAX_TOKENS), rule_confidence, telemetry, **inference_options)
+    telemetry.close()
+    journal.close()
 
 if __name__ == "__main__":
     main()
@@ -1,65 +1,101 @@
-import json
-import csv
-from gpt4all import GPT4All
+import time
+import argparse
 from tqdm import tqdm
+from inference_pool import InferenceStats, generate_outputs, add_inference_arguments, inference_options_from_args
+from backends import load_backend
+from dedup import mark_duplicates, add_dedup_arguments
+from job_store import iter_job_posts, default_input_file
+from prompt_compaction import PromptCompactor, add_compaction_arguments, prompt_token_budget_from_args
+from rule_answers import RuleEngine, QUESTION_FIELDS, answer_sources, add_rule_arguments
+from run_journal import RunJournal, add_journal_arguments
+from structured_output import ParseStats, json_instructions, parse_answers
+from telemetry import Telemetry, add_telemetry_arguments, telemetry_from_args
+from columnar_output import add_parquet_arguments, parquet_file_from_args
+
+MODEL_NAME = "Phi-3-mini-4k-instruct.Q4_0.gguf"
+# Longest answer generated per posting
+MAX_TOKENS = 350
 
 def load_data(filename):
-    """ Load the JSON file containing job postings """
-    with open(filename, 'r') as file:
-        return json.load(file)
+    """ Lazily load the job postings from the scraper's JSONL file (or an older JSON file) """
+    return iter_job_posts(filename)
 
-def initialize_model():
-    """ Initialize the GPT4All model """
-    return GPT4All("Phi-3-mini-4k-instruct.Q4_0.gguf")
+def initialize_model(n_threads=None, backend='gpt4all', backend_options=None):
+    """ Initialize the model (GPT4All unless another backend is picked) """
+    return load_backend(backend, MODEL_NAME, n_threads, **(backend_options or {}))
     # or Meta-Llama-3-8B-Instruct.Q4_0.gguf for llama 3 8B
     # orca-mini-3b-gguf2-q4_0.gguf
     #Phi-3-mini-4k-instruct.Q4_0.gguf
-def load_processed_urls(filename):
-    """ Load processed job URLs from CSV file to avoid re-processing """
-    try:
-        with open(filename, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            processed_urls = {rows[0] for rows in reader}
-            return processed_urls
-    except FileNotFoundError:
-        return set()
-
-def process_jobs(job_posts, model, processed_urls):
-    """ Process each job posting to generate the formatted response and print only the generated output """
-    with open('job_results.csv', mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not processed_urls:
-            # Write the headers to the CSV file only if it's the first run
-            writer.writerow(['Job URL', 'Job Title', 'Company Name', 'Location', 'Salary', 'Job Type', 'Job Description', 'Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages', 'Raw Output'])
-
-        for job_url, job_details in tqdm(job_posts.items(), desc="Processing Jobs"):
-            if job_url in processed_urls:
-                continue  # Skip processing if URL has already been processed
-
-            prompt = f"""
-            Analyze the job details provided and generate a structured response to the following questions:
+
+CSV_HEADER = ['Job URL', 'Job Title', 'Company Name', 'Location', 'Salary', 'Job Type', 'Job Description', 'Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages', 'Raw Output', 'Answer Source']
+# Written before the Answer Source column was added
+OLD_CSV_HEADER = CSV_HEADER[:-1]
+
+QUESTIONS = {
+    'Experience Required': "Does the job require experience? If yes, how many years?",
+    'Qualifications': "Which qualifications are preferred and which are required?",
+    'Security Clearance': "Does it require security clearance or US citizenship?",
+    'Job Location': "Is the position on-site, hybrid, or remote?",
+    'Position Type': "What is the position type? (contract, temp-to-hire, full-time, part-time, etc.)",
+    'Programming Languages': "What programming languages should the candidate know?",
+}
+
+# Instructions shared by every posting; they come first so the model only evaluates them once
+PROMPT_PREFIX = """
+            Analyze the job details that follow and answer these questions, each under its key:
+            """ + '\n            '.join(f"- {field}: {question}" for field, question in QUESTIONS.items()) + """
+"""
+
+def build_prompt(job_details, fields=QUESTION_FIELDS):
+    """ Create the prompt from job details, asking for a JSON object with only the questions in fields """
+    return PROMPT_PREFIX + f"""
+            Job details:
             - Job Title: {job_details.get('Job Title', 'No entry found for Job Title')}
             - Company Name: {job_details.get('Company Name', 'No entry found for Company Name')}
             - Location: {job_details.get('Location', 'No entry found for Location')}
             - Salary: {job_details.get('Salary', 'No entry found for Salary')}
             - Job Type: {job_details.get('Job Type', 'No entry found for Job Type')}
             - Job Description: {job_details.get('Job Description', 'No entry found for Job Description')}
-            
-            Questions:
-            1. Does the job require experience? If yes, how many years?
-            2. Which qualifications are preferred and which are required?
-            3. Does it require security clearance or US citizenship?
-            4. Is the position on-site, hybrid, or remote?
-            5. What is the position type? (contract, temp-to-hire, full-time, part-time, etc.)
-            6. What programming languages should the candidate know?
+
+            {json_instructions(fields)}
             """
 
-            generated_output = model.generate(prompt, max_tokens=350)
-            print(f"Generated Output for {job_url}: {generated_output}")
+def process_jobs(job_posts, model, journal, prompt_token_budget=0, rule_confidence=0.8, telemetry=None, parquet_file=None, **inference_options):
+    """ Process each job posting to generate the formatted response and print only the generated output """
+    stats = InferenceStats()
+    # Tokens, latency and memory of every posting, written next to the CSV
+    telemetry = telemetry or Telemetry('run_csv_output', None)
+    # Long descriptions are trimmed to the token budget before they reach the model
+    compactor = PromptCompactor(build_prompt, prompt_token_budget)
+    # Questions the text answers on its own skip the model
+    rules = RuleEngine(rule_confidence)
+    parse_stats = ParseStats()
+    items = (prompt_item(job_url, job_details, representative, rules, compactor)
+             for job_url, job_details, representative in job_posts)
+    outputs = generate_outputs(items, MAX_TOKENS, stats, model=model, model_name=MODEL_NAME, prompt_prefix=PROMPT_PREFIX, structured=True,
+                               with_metrics=True, **inference_options)
 
-            parsed_output = dict(zip(['Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages'], [x.split(': ')[1] if len(x.split(': ')) > 1 else '' for x in generated_output.split('\n')[1:]]))
+    try:
+        last_finished = time.perf_counter()
+        for (job_url, job_details, representative, resolved, unresolved), generated_output, metrics in tqdm(outputs, desc="Processing Jobs"):
+            if representative:
+                # Duplicates skip the model and reuse the answers journaled for their representative
+                status = 'duplicate'
+                generated_output, representative_row = journal.lookup(representative)
+                parsed_output = dict(zip(CSV_HEADER, representative_row))
+                sources = parsed_output['Answer Source']
+            else:
+                status = 'model' if unresolved else 'rules'
+                generated_output = generated_output or ''
+                print(f"Generated Output for {job_url}: {generated_output}")
+                # The model answers the questions it was asked; the rules fill in the rest
+                parsed_output, valid = parse_answers(generated_output, unresolved)
+                if unresolved:
+                    parse_stats.record(valid)
+                parsed_output.update({field: answer for field, (answer, _) in resolved.items()})
+                sources = answer_sources(resolved, unresolved)
 
-            writer.writerow([
+            row = [
                 job_url,
                 job_details.get('Job Title', ''),
                 job_details.get('Company Name', ''),
@@ -73,14 +109,68 @@ def process_jobs(job_posts, model, processed_urls):
                 parsed_output.get('Job Location', ''),
                 parsed_output.get('Position Type', ''),
                 parsed_output.get('Programming Languages', ''),
-                generated_output
-            ])
+                generated_output,
+                sources
+            ]
+            # Committed before the next posting, so a crash never loses a finished one
+            now = time.perf_counter()
+            journal.record(job_url, status, generated_output, row, now - last_finished)
+            telemetry.record(job_url, 'cache' if status == 'model' and metrics is None else status, metrics)
+            last_finished = now
+    finally:
+        # The CSV always holds every posting finished so far, from this run and the earlier ones
+        journal.export_csv('job_results.csv', CSV_HEADER)
+        if parquet_file:
+            journal.export_parquet(parquet_file, CSV_HEADER)
+
+    compactor.report()
+    stats.report()
+    telemetry.report()
+    parse_stats.report()
+    rules.report(stats)
+
+def prompt_item(job_url, job_details, representative, rules, compactor):
+    """ Split the questions between the rules and the model; the prompt is None when the model is not needed """
+    if representative:
+        return (job_url, job_details, representative, {}, []), None
+    resolved, unresolved = rules.resolve(job_details)
+    rules.record(resolved, unresolved)
+    prompt = compactor.prompt(job_url, job_details, unresolved) if unresolved else None
+    return (job_url, job_details, representative, resolved, unresolved), prompt
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Answer the job questions for every scraped posting and write them to job_results.csv")
+    parser.add_argument('--input', default=None, help="job postings file (default: job_posts.jsonl, or job_posts.json if there is none)")
+    add_inference_arguments(parser)
+    add_dedup_arguments(parser)
+    add_compaction_arguments(parser)
+    add_rule_arguments(parser)
+    add_journal_arguments(parser)
+    add_telemetry_arguments(parser)
+    add_parquet_arguments(parser)
+    return parser.parse_args()
 
 def main():
-    job_posts = load_data('job_posts.json')
-    model = initialize_model()
-    processed_urls = load_processed_urls('job_results.csv')
-    process_jobs(job_posts, model, processed_urls)
+    args = parse_args()
+    parquet_file = parquet_file_from_args(args)
+    job_posts = load_data(args.input or default_input_file())
+    journal = RunJournal('run_csv_output', args.journal)
+    if args.restart:
+        journal.reset()
+    else:
+        # Results from before the journal existed count as finished
+        journal.import_csv('job_results.csv', [CSV_HEADER, OLD_CSV_HEADER])
+    # Skip postings already finished, then send only one posting per group of near-identical descriptions to the model
+    job_posts = journal.skip_finished(job_posts)
+    job_posts = mark_duplicates(job_posts, None if args.no_dedup else args.dedup_threshold)
+    # Pool workers load their own copies of the model
+    inference_options = inference_options_from_args(args)
+    model = initialize_model(args.threads_per_worker, args.backend, inference_options['backend_options']) if args.workers <= 1 else None
+    rule_confidence = None if args.no_rules else args.rule_confidence
+    telemetry = telemetry_from_args('run_csv_output', args)
+    process_jobs(job_posts, model, journal, prompt_token_budget_from_args(args, MAX_TOKENS), rule_confidence, telemetry, parquet_file, **inference_options)
+    telemetry.close()
+    journal.close()
 
 if __name__ == "__main__":
     main()
@@ -1,96 +1,157 @@
 import json
-import csv
-from gpt4all import GPT4All
+import time
+import argparse
 from tqdm import tqdm
+from inference_pool import InferenceStats, generate_outputs, add_inference_arguments, inference_options_from_args
+from backends import load_backend
+from dedup import mark_duplicates, add_dedup_arguments
+from job_store import iter_job_posts, default_input_file
+from prompt_compaction import PromptCompactor, add_compaction_arguments, prompt_token_budget_from_args
+from run_journal import RunJournal, add_journal_arguments
+from structured_output import ParseStats, json_instructions, parse_answers
+from telemetry import Telemetry, add_telemetry_arguments, telemetry_from_args
+from columnar_output import add_parquet_arguments, parquet_file_from_args
+
+MODEL_NAME = "Phi-3-mini-4k-instruct.Q4_0.gguf"
+# Longest answer generated per posting
+MAX_TOKENS = 500
 
 def load_data(filename):
-    """ Load the JSON file containing job postings """
-    with open(filename, 'r') as file:
-        return json.load(file)
+    """ Lazily load the job postings from the scraper's JSONL file (or an older JSON file) """
+    return iter_job_posts(filename)
 
-def initialize_model():
-    """ Initialize the GPT4All model """
-    return GPT4All("Phi-3-mini-4k-instruct.Q4_0.gguf")
+def initialize_model(n_threads=None, backend='gpt4all', backend_options=None):
+    """ Initialize the model (GPT4All unless another backend is picked) """
+    return load_backend(backend, MODEL_NAME, n_threads, **(backend_options or {}))
     # or Meta-Llama-3-8B-Instruct.Q4_0.gguf for llama 3 8B
     # orca-mini-3b-gguf2-q4_0.gguf
     # for this longer context i had to download the model from this link
     # https://huggingface.co/crusoeai/Llama-3-8B-Instruct-262k-GGUF/blob/main/llama-3-8b-instruct-262k.Q4_0.gguf
     # Phi-3-mini-128k-instruct
 
-def process_jobs(job_posts, model):
-    """ Process each job posting to extract details and generate the formatted response """
-    with open('job_results.csv', 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        # Write the headers to the CSV file
-        writer.writerow(['Job URL', 'Job Title', 'Company Name', 'Location', 'Salary', 'Job Type', 'Job Description', 'Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages', 'Raw Generated Output'])
-
-        for job_url, job_details in tqdm(job_posts.items(), desc="Processing Jobs"):
-            # Convert entire job_details dictionary into a readable string for the prompt
-            details_str = json.dumps(job_details)
-
-            # Create the prompt for the model to extract all job details
-            prompt = f"""
-            Given the following job data:
+QUESTIONS = {
+    'Job Title': "What is the job title?",
+    'Company Name': "What company is offering the job?",
+    'Location': "Where is the job located?",
+    'Salary': "What is the salary range?",
+    'Job Type': "What type of job is it (full-time, part-time, contract, etc.)?",
+    'Job Description': "Provide a brief description of the job.",
+    'Experience Required': "Does the job require experience? If yes, how many years?",
+    'Qualifications': "Which qualifications are preferred and which are required?",
+    'Security Clearance': "Is security clearance or US citizenship required?",
+    'Job Location': "Is the position on-site, hybrid, or remote?",
+    'Programming Languages': "What programming languages should the candidate know?",
+}
+
+# Instructions shared by every posting; they come first so the model only evaluates them once
+PROMPT_PREFIX = """
+            Please extract these details from the job data that follows, each under its key:
+            """ + '\n            '.join(f"- {field}: {question}" for field, question in QUESTIONS.items()) + """
+            State 'Not mentioned' for anything the job data does not specify.
+"""
+
+def build_prompt(job_details):
+    """ Create the prompt for the model to extract all job details """
+    # Convert entire job_details dictionary into a readable string for the prompt
+    details_str = json.dumps(job_details)
+
+    return PROMPT_PREFIX + f"""
+            Job data:
             {details_str}
-            Please extract and respond with the specific details:
-            - What is the job title? (State 'Not mentioned' if not specified)
-            - What company is offering the job? (State 'Not mentioned' if not specified)
-            - Where is the job located? (State 'Not mentioned' if not specified)
-            - What is the salary range? (State 'Not mentioned' if not specified)
-            - What type of job is it (full-time, part-time, contract, etc.)? (State 'Not mentioned' if not specified)
-            - Provide a brief description of the job. (State 'Not mentioned' if not specified)
-            - Does the job require experience? If yes, how many years? (State 'Not mentioned' if not specified)
-            - Which qualifications are preferred and which are required? (State 'Not mentioned' if not specified)
-            - Is security clearance or US citizenship required? (State 'Not mentioned' if not specified)
-            - Is the position on-site, hybrid, or remote? (State 'Not mentioned' if not specified)
-            - What programming languages should the candidate know? (State 'Not mentioned' if not specified)
+
+            {json_instructions(QUESTIONS)}
             """
 
-            # Generate output from the model
-            generated_output = model.generate(prompt, max_tokens=500)
-
-            # Print the generated output
-            print(f"Generated Output for {job_url}: {generated_output}")
-
-            # Parse the output into structured format for CSV
-            parsed_output = parse_generated_output(generated_output)
-
-            # Write to CSV using the parsed output
-            writer.writerow([
-                job_url,
-                parsed_output.get('What is the job title?', 'Not mentioned'),
-                parsed_output.get('What company is offering the job?', 'Not mentioned'),
-                parsed_output.get('Where is the job located?', 'Not mentioned'),
-                parsed_output.get('What is the salary range?', 'Not mentioned'),
-                parsed_output.get('What type of job is it?', 'Not mentioned'),
-                parsed_output.get('Provide a brief description of the job.', 'Not mentioned'),
-                parsed_output.get('Does the job require experience?', 'Not mentioned'),
-                parsed_output.get('Which qualifications are preferred and which are required?', 'Not mentioned'),
-                parsed_output.get('Is security clearance or US citizenship required?', 'Not mentioned'),
-                parsed_output.get('Is the position on-site, hybrid, or remote?', 'Not mentioned'),
-                parsed_output.get('What programming languages should the candidate know?', 'Not mentioned'),
-                generated_output  # Include raw generated output
-            ])
-
-def parse_generated_output(generated_output):
-    """ Parse the generated output from the model into a structured dictionary """
-    output_dict = {}
-    lines = generated_output.split('\n')
-    for line in lines:
-        if ':' in line:
-            key, value = line.split(':', 1)
-            output_dict[key.strip()] = value.strip()
-    return output_dict
+CSV_HEADER = ['Job URL', 'Job Title', 'Company Name', 'Location', 'Salary', 'Job Type', 'Job Description', 'Experience Required', 'Qualifications', 'Security Clearance', 'Job Location', 'Position Type', 'Programming Languages', 'Raw Generated Output']
+
+def build_row(job_url, generated_output):
+    """ Parse the model's JSON into one value per CSV column; returns (row, whether every field was answered) """
+    parsed_output, valid = parse_answers(generated_output, QUESTIONS)
+    # The job type question answers both type columns
+    parsed_output['Position Type'] = parsed_output.get('Job Type', 'Not mentioned')
+    row = [job_url] + [parsed_output.get(column, 'Not mentioned') for column in CSV_HEADER[1:-1]] + [generated_output]
+    return row, valid
+
+def process_jobs(job_posts, model, journal, prompt_token_budget=0, telemetry=None, parquet_file=None, **inference_options):
+    """ Process each job posting to extract details and generate the formatted response """
+    stats = InferenceStats()
+    # Tokens, latency and memory of every posting, written next to the results
+    telemetry = telemetry or Telemetry('run_full_input_csv_output', None)
+    # Long fields are trimmed to the token budget before they reach the model, so the
+    # whole dict fits in the context window next to the answer
+    compactor = PromptCompactor(build_prompt, prompt_token_budget, fields=None)
+    parse_stats = ParseStats()
+    items = (((job_url, representative), None if representative else compactor.prompt(job_url, job_details))
+             for job_url, job_details, representative in job_posts)
+    # Generate output from the model
+    outputs = generate_outputs(items, MAX_TOKENS, stats, model=model, model_name=MODEL_NAME, prompt_prefix=PROMPT_PREFIX,
+                               structured=True, with_metrics=True, **inference_options)
+
+    try:
+        last_finished = time.perf_counter()
+        for (job_url, representative), generated_output, metrics in tqdm(outputs, desc="Processing Jobs"):
+            if representative:
+                # Duplicates skip the model and reuse the answer journaled for their representative
+                generated_output, _ = journal.lookup(representative)
+            else:
+                # Print the generated output
+                print(f"Generated Output for {job_url}: {generated_output}")
+
+            row, valid = build_row(job_url, generated_output)
+            if not representative:
+                parse_stats.record(valid)
+            # Committed before the next posting, so a crash never loses a finished one
+            now = time.perf_counter()
+            journal.record(job_url, 'duplicate' if representative else 'model', generated_output, row, now - last_finished)
+            telemetry.record(job_url, 'duplicate' if representative else 'model' if metrics else 'cache', metrics)
+            last_finished = now
+    finally:
+        # Write the CSV from everything finished so far
+        journal.export_csv('job_results.csv', CSV_HEADER)
+        if parquet_file:
+            journal.export_parquet(parquet_file, CSV_HEADER)
+
+    compactor.report()
+    stats.report()
+    telemetry.report()
+    parse_stats.report()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract every job detail with the model and write them to job_results.csv")
+    parser.add_argument('--input', default=None, help="job postings file (default: job_posts.jsonl, or job_posts.json if there is none)")
+    add_inference_arguments(parser)
+    add_dedup_arguments(parser)
+    add_compaction_arguments(parser)
+    add_journal_arguments(parser)
+    add_telemetry_arguments(parser)
+    add_parquet_arguments(parser)
+    return parser.parse_args()
 
 def main():
-    # Load job postings from a JSON file
-    job_posts = load_data('job_posts.json')
+    args = parse_args()
+    parquet_file = parquet_file_from_args(args)
+
+    # Stream job postings from the JSONL file
+    job_posts = load_data(args.input or default_input_file())
+
+    # Pick up where an interrupted run stopped; --restart throws its results away
+    journal = RunJournal('run_full_input_csv_output', args.journal)
+    if args.restart:
+        journal.reset()
+    job_posts = journal.skip_finished(job_posts)
+
+    # Only one posting per group of near-identical descriptions goes through the model
+    job_posts = mark_duplicates(job_posts, None if args.no_dedup else args.dedup_threshold)
 
-    # Initialize the GPT4All model
-    model = initialize_model()
+    # Initialize the model (pool workers load their own copies)
+    inference_options = inference_options_from_args(args)
+    model = initialize_model(args.threads_per_worker, args.backend, inference_options['backend_options']) if args.workers <= 1 else None
 
     # Process each job posting and extract details
-    process_jobs(job_posts, model)
+    telemetry = telemetry_from_args('run_full_input_csv_output', args)
+    process_jobs(job_posts, model, journal, prompt_token_budget_from_args(args, MAX_TOKENS), telemetry, parquet_file, **inference_options)
+    telemetry.close()
+    journal.close()
 
 if __name__ == "__main__":
     main()
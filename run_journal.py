@@ -0,0 +1,159 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+from dedup import normalize_job_url
+
+JOURNAL_FILE = 'run_journal.sqlite'
+
+
+class RunJournal:
+    """ Crash-safe record of every posting a runner has finished
+
+    Each posting is committed in its own transaction as soon as it is done, with
+    its status, raw model output, output row and how long it took. A runner that
+    is restarted skips the postings already in the journal, and the CSV or JSON
+    output is written from the journal instead of row by row. Several runners
+    can share one journal file; their postings are kept apart by runner name.
+
+    Postings count as finished by their job key (normalize_job_url), so a
+    re-crawl that finds the same job under a new tracking URL skips it too.
+    Rows keep the URL the posting was scraped with. record() and lookup() can
+    be called from any thread.
+    """
+
+    def __init__(self, runner, filename=JOURNAL_FILE):
+        self.runner = runner
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # Every commit reaches the disk before the next posting starts
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS postings (
+                                 seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                 runner TEXT NOT NULL,
+                                 job_url TEXT NOT NULL,
+                                 status TEXT NOT NULL,
+                                 output TEXT,
+                                 row TEXT,
+                                 seconds REAL NOT NULL,
+                                 finished REAL NOT NULL,
+                                 job_key TEXT,
+                                 UNIQUE (runner, job_url))''')
+        # Journals written before postings were keyed on their job key
+        if 'job_key' not in {column[1] for column in self.conn.execute('PRAGMA table_info(postings)')}:
+            self.conn.execute('ALTER TABLE postings ADD COLUMN job_key TEXT')
+        missing = self.conn.execute('SELECT seq, job_url FROM postings WHERE job_key IS NULL').fetchall()
+        self.conn.executemany('UPDATE postings SET job_key = ? WHERE seq = ?', [(normalize_job_url(job_url), seq) for seq, job_url in missing])
+        self.conn.execute('CREATE INDEX IF NOT EXISTS postings_job_key ON postings (runner, job_key)')
+        self.conn.commit()
+
+    def done_keys(self):
+        """ Job keys (see normalize_job_url) of the postings this runner has finished """
+        return {job_key for job_key, in self.conn.execute('SELECT job_key FROM postings WHERE runner = ?', (self.runner,))}
+
+    def skip_finished(self, job_posts):
+        """ Pass on the (job_url, job_details) pairs whose job this runner has not finished yet """
+        done = self.done_keys()
+        for job_url, job_details in job_posts:
+            if normalize_job_url(job_url) not in done:
+                yield job_url, job_details
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM postings WHERE runner = ? LIMIT 1', (self.runner,)).fetchone() is None
+
+    def record(self, job_url, status, output, row=None, seconds=0.0):
+        """ Commit one finished posting """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO postings (runner, job_url, status, output, row, seconds, finished, job_key) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (self.runner, job_url, status, output,
+                               None if row is None else json.dumps(row), seconds, time.time(), normalize_job_url(job_url)))
+
+    def lookup(self, job_url):
+        """ (output, row) of a posting this runner has finished, or None """
+        with self.lock:
+            found = self.conn.execute('SELECT output, row FROM postings WHERE runner = ? AND job_url = ?', (self.runner, job_url)).fetchone()
+        if found is None:
+            return None
+        output, row = found
+        return output, None if row is None else json.loads(row)
+
+    def entries(self):
+        """ Yield (job_url, status, output, row) in the order the postings were finished """
+        query = 'SELECT job_url, status, output, row FROM postings WHERE runner = ? ORDER BY seq'
+        for job_url, status, output, row in self.conn.execute(query, (self.runner,)):
+            yield job_url, status, output, None if row is None else json.loads(row)
+
+    def import_csv(self, filename, headers):
+        """ Seed an empty journal from a results CSV written before the journal existed
+
+        Every runner writes job_results.csv, so the file is only imported when
+        its header is one of headers, i.e. this runner wrote it.
+        """
+        if not self.is_empty() or not os.path.exists(filename):
+            return 0
+        with open(filename, newline='', encoding='utf-8') as file:
+            rows = list(csv.reader(file))
+        if not rows or rows[0] not in [list(header) for header in headers]:
+            print(f"Not importing {filename}: its columns are not the ones {self.runner} writes")
+            return 0
+        rows = rows[1:]
+        with self.conn:
+            for row in rows:
+                if row:
+                    self.conn.execute('INSERT OR IGNORE INTO postings (runner, job_url, status, output, row, seconds, finished, job_key) '
+                                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                      (self.runner, row[0], 'imported', None, json.dumps(row), 0.0, time.time(), normalize_job_url(row[0])))
+        return len(rows)
+
+    def reset(self):
+        """ Forget this runner's postings so the next run starts over """
+        with self.conn:
+            self.conn.execute('DELETE FROM postings WHERE runner = ?', (self.runner,))
+
+    def export_csv(self, filename, header):
+        """ Write every journaled row to filename, replacing it in one step """
+        with _atomic_write(filename) as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for _, _, _, row in self.entries():
+                if row is not None:
+                    writer.writerow(row)
+
+    def export_parquet(self, filename, header, batch_rows=1000):
+        """ Write every journaled row to a Parquet file with the CSV's columns, batch_rows at a time """
+        from columnar_output import write_parquet
+        write_parquet(filename, header, (row for _, _, _, row in self.entries() if row is not None), batch_rows)
+
+    def export_json(self, filename):
+        """ Write {job_url: output} for every journaled posting to filename, replacing it in one step """
+        with _atomic_write(filename) as file:
+            json.dump({job_url: output for job_url, _, output, _ in self.entries()}, file, indent=4)
+
+    def close(self):
+        self.conn.close()
+
+
+@contextlib.contextmanager
+def _atomic_write(filename):
+    """ Write to a temporary file and move it over filename only once it is complete and on disk """
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w', newline='', encoding='utf-8') as file:
+        try:
+            yield file
+        except BaseException:
+            file.close()
+            os.remove(temp_filename)
+            raise
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+def add_journal_arguments(parser):
+    parser.add_argument('--journal', default=JOURNAL_FILE, help="SQLite checkpoint journal used to resume interrupted runs")
+    parser.add_argument('--restart', action='store_true', help="forget the postings this script already finished and start over")
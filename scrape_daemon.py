@@ -0,0 +1,158 @@
+""" Crawl Indeed without the GUI, again and again, keeping only postings not seen before
+
+    python scrape_daemon.py "software" "developer" --location "Atlanta, GA" --num-results 100 --every 60
+    python scrape_daemon.py "software" --once --fetch-mode http
+
+Every posting ever scraped is remembered in seen_jobs.sqlite by its job key,
+so each crawl skips the links it already has and stops paging through a
+search as soon as a result page has nothing new on it. New postings are
+appended to job_posts.jsonl for the run scripts, and each crawl's postings
+also go to a file of their own in --delta-dir, so whatever reads them next
+only has to look at what changed. Stop it with Ctrl+C or SIGTERM; the crawl
+in progress finishes the pages it is on and writes their postings before
+the files are closed.
+"""
+import os
+import time
+import signal
+import sqlite3
+import argparse
+import threading
+from dedup import normalize_job_url
+from job_classifier import classify_job_description
+from job_store import JobPostWriter, JSONL_FILE, iter_job_posts
+from scrape_engine import ScrapeEngine
+
+SEEN_FILE = 'seen_jobs.sqlite'
+DELTA_DIR = 'job_post_deltas'
+
+
+class SeenJobIndex:
+    """ Job keys of every posting scraped so far, kept across runs in SQLite
+
+    Postings are keyed on normalize_job_url, so the many tracking URLs Indeed
+    gives one posting count as the same job. add() is called from the crawler
+    threads and commits straight away, so a posting is only remembered once
+    it has been written out.
+    """
+
+    def __init__(self, filename=SEEN_FILE):
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS seen (
+                                 job_key TEXT PRIMARY KEY,
+                                 job_url TEXT NOT NULL,
+                                 first_seen REAL NOT NULL)''')
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def keys(self):
+        with self.lock:
+            return frozenset(key for key, in self.conn.execute('SELECT job_key FROM seen'))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def add(self, job_url):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO seen (job_key, job_url, first_seen) VALUES (?, ?, ?)',
+                              (normalize_job_url(job_url), job_url, time.time()))
+
+    def import_posts(self, filename):
+        """ Count the postings of an earlier crawl as seen; returns how many there were """
+        count = 0
+        with self.lock, self.conn:
+            for job_url, _ in iter_job_posts(filename):
+                self.conn.execute('INSERT OR IGNORE INTO seen (job_key, job_url, first_seen) VALUES (?, ?, ?)',
+                                  (normalize_job_url(job_url), job_url, time.time()))
+                count += 1
+        return count
+
+    def close(self):
+        self.conn.close()
+
+
+class ScrapeDaemon:
+    def __init__(self, args):
+        self.args = args
+        self.index = SeenJobIndex(args.seen)
+        # The first time, whatever is already in the output file counts as seen
+        if not len(self.index) and os.path.exists(args.output):
+            print(f"Marked {self.index.import_posts(args.output)} postings from {args.output} as seen")
+        self.engine = None
+        self.stopping = threading.Event()
+
+    def stop(self, *_):
+        self.stopping.set()
+        if self.engine is not None:
+            self.engine.stop()
+
+    def crawl_once(self):
+        """ Crawl every search term once, writing only new postings; returns how many there were """
+        os.makedirs(self.args.delta_dir, exist_ok=True)
+        delta_file = os.path.join(self.args.delta_dir, f"job_posts_{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        output = JobPostWriter(self.args.output)
+        delta = JobPostWriter(delta_file, mode='w')
+        new_postings = 0
+
+        # The engine calls this under its lock, one posting at a time
+        def on_posting(href, classified_data):
+            nonlocal new_postings
+            output.write(href, classified_data)
+            delta.write(href, classified_data)
+            self.index.add(href)
+            new_postings += 1
+
+        self.engine = ScrapeEngine(self.args.search_terms, self.args.location, self.args.num_results,
+                                   classify_job_description, on_posting, num_drivers=self.args.browsers,
+                                   fetch_mode=self.args.fetch_mode, known=self.index.keys(), stop_when_stale=True)
+        try:
+            self.engine.run()
+        finally:
+            output.close()
+            delta.close()
+        if new_postings:
+            print(f"{new_postings} new postings written to {delta_file}")
+        else:
+            os.remove(delta_file)
+            print("No new postings")
+        return new_postings
+
+    def run(self):
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self.crawl_once()
+            if self.args.once or self.stopping.is_set():
+                break
+            wait = max(0.0, self.args.every * 60 - (time.monotonic() - started))
+            print(f"Next crawl in {wait / 60:.1f} minutes ({len(self.index)} postings seen so far)")
+            self.stopping.wait(wait)
+        self.index.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('search_terms', nargs='+', help="search terms to crawl on Indeed")
+    parser.add_argument('--location', default='')
+    parser.add_argument('--num-results', type=int, default=100, help="most new postings to scrape per crawl")
+    parser.add_argument('--browsers', type=int, default=4, help="parallel browser sessions")
+    parser.add_argument('--fetch-mode', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--every', type=float, default=60, help="minutes from the start of one crawl to the start of the next")
+    parser.add_argument('--once', action='store_true', help="crawl once and exit")
+    parser.add_argument('--seen', default=SEEN_FILE, help="SQLite file of the postings already scraped")
+    parser.add_argument('--output', default=JSONL_FILE, help="JSONL file every new posting is appended to")
+    parser.add_argument('--delta-dir', default=DELTA_DIR, help="directory that gets one JSONL file of new postings per crawl")
+    return parser.parse_args()
+
+
+def main():
+    daemon = ScrapeDaemon(parse_args())
+    # Ask the crawler threads to stop instead of raising in the main thread, so engine.run() drains before the files close
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import time
+import queue
+import threading
+import urllib.parse
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from dedup import normalize_job_url
+from http_fetch import HttpJobFetcher
+
+INDEED_SEARCH_URL = "https://www.indeed.com/jobs?q={query}&l={location}"
+INDEED_JOB_LINK_PREFIX = "https://www.indeed.com/rc/clk"
+
+
+def get_job_text(driver):
+    try:
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        job_text = driver.find_element(By.TAG_NAME, "body").text.strip()
+        return job_text if job_text else None
+    except:
+        return None
+
+
+def make_driver(headless=True):
+    """ Start a Firefox session, without a window unless headless is False """
+    options = webdriver.FirefoxOptions()
+    if headless:
+        options.add_argument("-headless")
+    return webdriver.Firefox(options=options)
+
+
+class HostRateLimiter:
+    """ Spaces out requests to the same host by at least min_interval seconds, across all threads """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BrowserSession:
+    """ A worker's browser, only started the first time a page needs rendering """
+
+    def __init__(self, driver_factory, headless):
+        self.driver_factory = driver_factory
+        self.headless = headless
+        self.driver = None
+
+    def load(self, url):
+        if self.driver is None:
+            self.driver = self.driver_factory(self.headless)
+        self.driver.get(url)
+        return self.driver
+
+    def quit(self):
+        if self.driver is not None:
+            self.driver.quit()
+
+
+class CrawlStats:
+    def __init__(self):
+        self.pages = 0
+        self.postings = 0
+        self.browser_fallbacks = 0
+        self.stale_pages = 0
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record_page(self, is_posting):
+        with self.lock:
+            self.pages += 1
+            if is_posting:
+                self.postings += 1
+
+    def record_browser_fallback(self):
+        with self.lock:
+            self.browser_fallbacks += 1
+
+    def record_stale_page(self):
+        with self.lock:
+            self.stale_pages += 1
+
+    def summary(self):
+        minutes = max(time.perf_counter() - self.start_time, 1e-9) / 60
+        return (f"Scraped {self.postings} postings from {self.pages} pages in {minutes * 60:.0f}s "
+                f"({self.pages / minutes:.1f} pages/min, {self.postings / minutes:.1f} postings/min, "
+                f"{self.browser_fallbacks} job pages needed the browser"
+                + (f", {self.stale_pages} searches stopped on a page with nothing new)" if self.stale_pages else ")"))
+
+
+class ScrapeEngine:
+    """ Crawls search result pages and job pages with a pool of browser sessions
+
+    Every worker thread owns one driver and pulls search pages and job pages from
+    a shared queue, so several search terms and result pages are crawled at once.
+    Job links are de-duplicated on their job key across all workers, and requests
+    to each host go through a shared rate limiter. search_url and job_link_prefix
+    can point at a local copy of Indeed for testing.
+
+    With fetch_mode='http', job pages are first fetched with a plain keep-alive
+    HTTP client and only rendered in the browser when the static HTML has no
+    job description. fetch_mode='browser' renders every page.
+
+    known holds the job keys (see normalize_job_url) of postings scraped in
+    earlier runs; they are skipped like links seen in this run. With
+    stop_when_stale=True a search stops paginating at the first result page
+    where every posting is from an earlier run, since Indeed lists the newest
+    first. Links another search term already found in this run do not count,
+    so overlapping search terms still page through their own results.
+    """
+
+    def __init__(self, search_terms, location, num_results, classify, on_posting,
+                 num_drivers=4, min_interval=1.0, headless=True, fetch_mode='browser',
+                 search_url=INDEED_SEARCH_URL, job_link_prefix=INDEED_JOB_LINK_PREFIX, driver_factory=make_driver,
+                 known=frozenset(), stop_when_stale=False):
+        self.search_terms = list(search_terms)
+        self.location = location
+        self.num_results = num_results
+        self.classify = classify
+        self.on_posting = on_posting
+        self.num_drivers = num_drivers
+        self.headless = headless
+        self.fetch_mode = fetch_mode
+        self.search_url = search_url
+        self.job_link_prefix = job_link_prefix
+        self.driver_factory = driver_factory
+        self.known = known
+        self.stop_when_stale = stop_when_stale
+        self.rate_limiter = HostRateLimiter(min_interval)
+        self.stats = CrawlStats()
+
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.scraped = 0
+        self.skipped_terms = set()
+        self.pending_per_term = {term: 0 for term in self.search_terms}
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def skip_search_term(self):
+        """ Drop the remaining pages of the earliest search term still being crawled """
+        with self.lock:
+            for term in self.search_terms:
+                if term not in self.skipped_terms and self.pending_per_term[term]:
+                    self.skipped_terms.add(term)
+                    return term
+        return None
+
+    def _put(self, kind, term, url):
+        with self.lock:
+            self.pending_per_term[term] += 1
+        self.tasks.put((kind, term, url))
+
+    def run(self):
+        for term in self.search_terms:
+            url = self.search_url.format(query=urllib.parse.quote(term), location=urllib.parse.quote(self.location))
+            self._put('search', term, url)
+
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.num_drivers)]
+        for worker in workers:
+            worker.start()
+        self.tasks.join()
+        for _ in workers:
+            self.tasks.put(None)
+        for worker in workers:
+            worker.join()
+
+        print(self.stats.summary())
+        return self.stats
+
+    def _done(self):
+        return self.stopped or self.scraped >= self.num_results
+
+    def _worker(self):
+        browser = BrowserSession(self.driver_factory, self.headless)
+        fetcher = HttpJobFetcher() if self.fetch_mode == 'http' else None
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    self.tasks.task_done()
+                    return
+                try:
+                    kind, term, url = task
+                    if self._done() or term in self.skipped_terms:
+                        continue
+                    if kind == 'search':
+                        self.rate_limiter.wait(url)
+                        self._handle_search_page(browser.load(url), term)
+                    else:
+                        self._handle_job_page(browser, fetcher, url)
+                except WebDriverException as e:
+                    print(f"Failed to load {task[2]}: {e}")
+                except Exception as e:
+                    # A bad page or a failing callback must not take the worker down with it
+                    print(f"Failed to process {task[2]}: {e!r}")
+                finally:
+                    with self.lock:
+                        self.pending_per_term[task[1]] -= 1
+                    self.tasks.task_done()
+        finally:
+            browser.quit()
+            if fetcher is not None:
+                fetcher.close()
+
+    def _handle_search_page(self, driver, term):
+        self.stats.record_page(False)
+        hrefs = []
+        for link in driver.find_elements(By.XPATH, "//a"):
+            try:
+                href = link.get_attribute("href")
+            except StaleElementReferenceException:
+                continue
+            if href and href.startswith(self.job_link_prefix):
+                hrefs.append(href)
+
+        new_hrefs = []
+        stale = bool(hrefs)
+        with self.lock:
+            for href in hrefs:
+                key = normalize_job_url(href)
+                if key not in self.known:
+                    stale = False
+                if key not in self.seen and key not in self.known:
+                    self.seen.add(key)
+                    new_hrefs.append(href)
+            enough = len(self.seen) >= self.num_results
+        for href in new_hrefs:
+            self._put('job', term, href)
+
+        if enough:
+            return
+        if self.stop_when_stale and stale:
+            self.stats.record_stale_page()
+            return
+        try:
+            next_page_url = driver.find_element(By.XPATH, "//a[@data-testid='pagination-page-next']").get_attribute("href")
+        except NoSuchElementException:
+            return
+        if next_page_url:
+            self._put('search', term, next_page_url)
+
+    def _handle_job_page(self, browser, fetcher, url):
+        job_text = None
+        if fetcher is not None:
+            self.rate_limiter.wait(url)
+            job_text = fetcher.fetch(url)
+            if job_text is None:
+                self.stats.record_browser_fallback()
+
+        if job_text is None:
+            self.rate_limiter.wait(url)
+            driver = browser.load(url)
+            for _ in range(3):
+                job_text = get_job_text(driver)
+                if job_text is not None:
+                    break
+        self.stats.record_page(job_text is not None)
+        if job_text is None:
+            return
+
+        classified_data = self.classify(job_text)
+        with self.lock:
+            if self.scraped >= self.num_results:
+                return
+            self.scraped += 1
+            self.on_posting(url, classified_data)
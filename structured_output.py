@@ -0,0 +1,110 @@
+import json
+
+# Appended to the prompt when the first answer was not a JSON object with every requested key
+RETRY_REMINDER = "\nYour previous answer was not a complete JSON object. Respond with the JSON object only, with every key, starting with {.\n"
+
+# Ends the json_instructions line, just before the keys
+KEYS_MARKER = "using exactly these keys: "
+
+_DECODER = json.JSONDecoder()
+
+
+def json_instructions(fields):
+    """ Prompt lines asking for one JSON object with exactly the given keys """
+    template = json.dumps({field: "..." for field in fields})
+    return f"Respond with only a JSON object, with no other text, {KEYS_MARKER}{template}"
+
+
+def requested_fields(prompt):
+    """ The keys the prompt's json_instructions ask for, or None if it has none """
+    start = prompt.rfind(KEYS_MARKER)
+    if start == -1:
+        return None
+    try:
+        value, _ = _DECODER.raw_decode(prompt, start + len(KEYS_MARKER))
+    except ValueError:
+        return None
+    return list(value) if isinstance(value, dict) else None
+
+
+class JsonObjectEnd:
+    """ Generation callback that stops the model as soon as the first JSON object is closed
+
+    GPT4All calls it with every new piece of text; returning False ends the
+    generation, so the model does not keep writing prose up to max_tokens.
+    Each piece is scanned once, tracking strings and brace depth.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def __call__(self, token_id, response):
+        for char in response:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}' and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    return False
+        return True
+
+
+def parse_json_object(text):
+    """ The first JSON object in text, or None if there is none """
+    start = text.find('{')
+    if start == -1:
+        return None
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def parse_answers(text, fields):
+    """ Return ({field: answer}, valid) from the model's JSON; valid means every field was answered
+
+    Keys are matched without regard to case or surrounding spaces, and lists
+    are joined with commas so every answer fits in a CSV cell.
+    """
+    value = parse_json_object(text)
+    if value is None:
+        return {}, False
+    by_key = {str(key).strip().lower(): answer for key, answer in value.items()}
+    answers = {}
+    for field in fields:
+        answer = by_key.get(field.lower())
+        if answer is None:
+            continue
+        if isinstance(answer, list):
+            answer = ', '.join(str(item) for item in answer)
+        answers[field] = str(answer)
+    return answers, len(answers) == len(fields)
+
+
+class ParseStats:
+    def __init__(self):
+        self.parsed = 0
+        self.failed = 0
+
+    def record(self, valid):
+        if valid:
+            self.parsed += 1
+        else:
+            self.failed += 1
+
+    def report(self):
+        total = self.parsed + self.failed
+        if total:
+            print(f"Parsed {self.parsed} of {total} model answers as complete JSON ({self.parsed / total:.0%})")
@@ -0,0 +1,92 @@
+import sys
+import json
+import math
+import time
+
+# Written next to job_results.csv, one line per posting
+METRICS_FILE = 'job_metrics.jsonl'
+
+
+def peak_rss_mb():
+    """ Peak resident memory of this process in MB, or None where the OS does not report it """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of values, which must already be sorted """
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Telemetry:
+    """ Per-posting inference metrics, appended as JSON lines and summarized at the end of the run
+
+    Every line has the posting's URL, how it was answered (model, rules,
+    duplicate, cache) and, for postings the model ran on, the prompt and
+    generated tokens, the seconds to the first token and in total, tokens/sec
+    and the peak memory of the process that ran the model. Resumed runs append
+    to the same file. With no filename nothing is written but the summary
+    still is.
+    """
+
+    def __init__(self, runner, filename=METRICS_FILE):
+        self.runner = runner
+        self.file = open(filename, 'a', encoding='utf-8') if filename else None
+        self.generations = []
+        self.statuses = {}
+
+    def record(self, job_url, status, metrics=None):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        entry = {'runner': self.runner, 'job_url': job_url, 'status': status, 'finished': time.time()}
+        if metrics:
+            entry.update(metrics)
+            self.generations.append(metrics)
+        if self.file is not None:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def summary(self):
+        """ Percentiles of the model's latencies over the postings it ran on """
+        latencies = sorted(metrics['seconds'] for metrics in self.generations)
+        first_tokens = sorted(metrics['first_token_seconds'] for metrics in self.generations
+                              if metrics.get('first_token_seconds') is not None)
+        rates = sorted(metrics['tokens_per_second'] for metrics in self.generations)
+        peaks = [metrics['peak_rss_mb'] for metrics in self.generations if metrics.get('peak_rss_mb') is not None]
+        return {
+            'postings': dict(self.statuses),
+            'latency': {name: percentile(latencies, fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+            'first_token': {name: percentile(first_tokens, fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+            'tokens_per_second_p50': percentile(rates, 0.5),
+            'peak_rss_mb': max(peaks) if peaks else None,
+        }
+
+    def report(self):
+        if not self.generations:
+            return
+        summary = self.summary()
+        latency, first_token = summary['latency'], summary['first_token']
+        print(f"Latency per posting: p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, p99 {latency['p99']:.2f}s")
+        if first_token['p50'] is not None:
+            print(f"Time to first token: p50 {first_token['p50']:.2f}s, p95 {first_token['p95']:.2f}s, p99 {first_token['p99']:.2f}s")
+        print(f"Median {summary['tokens_per_second_p50']:.1f} tokens/sec per posting"
+              + (f", peak memory {summary['peak_rss_mb']:.0f} MB" if summary['peak_rss_mb'] is not None else ''))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def add_telemetry_arguments(parser):
+    parser.add_argument('--metrics', default=METRICS_FILE, help="JSONL file that gets the tokens, latency and memory of every posting")
+    parser.add_argument('--no-metrics', action='store_true', help="only print the latency summary, without writing the metrics file")
+
+
+def telemetry_from_args(runner, args):
+    return Telemetry(runner, None if args.no_metrics else args.metrics)
@@ -0,0 +1,34 @@
+import pytest
+from rule_answers import answer_experience, answer_security_clearance
+
+# Snippets taken from the postings in job_posts.json
+EXPERIENCE = [
+    ("0-2 years of Experience in Software Engineering", ('No', 0.85)),
+    ("Required Qualifications: 0 years of related experience with a Bachelor's degree", ('No', 0.85)),
+    ("3+ years of experience in data science", ('Yes, 3+ years', 0.9)),
+    ("2-4 years of experience with .NET", ('Yes, 2-4 years', 0.9)),
+    ("Experience: Typically requires 1-2 years experience", ('Yes, 1-2 years', 0.9)),
+    ("Proven experience of 6-8 years in performance testing", ('Yes, 6-8 years', 0.9)),
+    ("5+ years of hands-on experience. 3 years of Spark experience", ('Yes, 5+ years', 0.6)),
+    ("No prior experience required, we will train you", ('No', 0.9)),
+    ("Join a collaborative team building web applications", None),
+]
+
+CLEARANCE = [
+    ("Candidates must have an Active Top Secret Clearance", ('Yes, top secret', 0.9)),
+    ("Must be able to obtain and maintain a Public Trust clearance", ('Yes, public trust', 0.9)),
+    ("US Citizens or Green card holders only", ('Yes, US citizenship', 0.85)),
+    ("U.S. Citizenship Requirements: applicants must be U.S. citizens", ('Yes, US citizenship', 0.85)),
+    ("This position does not require security clearance.", ('No', 0.9)),
+    ("Join a collaborative team building web applications", ('No', 0.5)),
+]
+
+
+@pytest.mark.parametrize('text, expected', EXPERIENCE)
+def test_answer_experience(text, expected):
+    assert answer_experience(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', CLEARANCE)
+def test_answer_security_clearance(text, expected):
+    assert answer_security_clearance(text) == expected